@@ -4,12 +4,20 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly_express as px
-from helper_funcs import data_parser, st_filters
+from helper_funcs import backends, data_parser, st_filters
 from streamlit_extras.metric_cards import style_metric_cards
 from streamlit_extras.annotated_text import annotated_text
 from helper_funcs import st_plots
 
 
+# Columns this page reads: the sidebar filters, the summary bundle and the activity heatmaps
+COLUMNS = [
+    "order_id", "order_status", "order_purchase_timestamp",
+    "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+    "product_id", "price", "freight_value", "payment_type", "product_category_name",
+    "seller_city", "seller_state", "customer_city", "customer_state",
+]
+
 st.set_page_config(page_icon="🧮", layout="wide", initial_sidebar_state="expanded")
 
 styles.load_css_file("assets/styles/main.css")
@@ -22,23 +30,24 @@ show_pages([
 
 ])
 
-df = data_parser.read_data()
-
 # Sidebar Filters
 st.sidebar.header("Filters")
 st.sidebar.write("**View Revenue/Volume**")
 view = st.sidebar.selectbox(
     "view", options=["Revenue 💸", "Volume 📦"], key="view", label_visibility="collapsed")
 
+add_freight = False
 if view == "Revenue 💸":
-    if st.sidebar.checkbox("Add Freight Value to Order"):
-        df['price'] = df['price'] + df['freight_value']
+    add_freight = st.sidebar.checkbox("Add Freight Value to Order")
 
-filters = st_filters.filter_widgets(df)
-df = st_filters.filter_data(df, *filters)
+# Pandas or DuckDB (OLIST_BACKEND); this page only needs aggregates, never the rows
+backend = backends.open_backend("general", add_freight=add_freight, columns=COLUMNS)
+filters = st_filters.filter_widgets(backend.filter_options())
+summary = backend.summary(filters)
 
-total_request_value = df['price'].sum()
-total_supplied_value = df[df['order_status'].isin(
+total_request_value = summary['overall']['price']
+monthly = summary['monthly']
+total_supplied_value = monthly[monthly['order_status'].isin(
     ["delivered", "shipped"])]['price'].sum()
 fr = np.round(total_supplied_value/total_request_value * 100, 2)
 
@@ -59,9 +68,9 @@ style_metric_cards()
 
 st.subheader("Performance Breakdown")
 if view == "Revenue 💸":
-    st_plots.revenue_plots(df)
+    st_plots.revenue_plots(summary)
 if view == "Volume 📦":
-    st_plots.volume_plots(df)
+    st_plots.volume_plots(summary)
 
 st.subheader("Ordering Activity")
 time_match = {"Order Purchase Time": "order_purchase_timestamp",
@@ -71,8 +80,7 @@ st.write("**Select Date Column**")
 sel_col = st.selectbox(
     "sel_date_col", options=time_match.keys(), label_visibility="collapsed")
 sel_col = time_match[sel_col]
-ht_df = df.groupby(sel_col).agg(
-    num_orders=("order_id", "count")).reset_index()
+ht_df = backend.activity(filters, sel_col)
 
 # Day vs Hour
 tab1, tab2, tab3 = st.tabs(
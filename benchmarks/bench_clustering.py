@@ -0,0 +1,67 @@
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+from helper_funcs.ml_models import cluster_labels
+
+# Rough (lat, lng) of the largest customer cities, weighted like the Olist customer base
+CITY_CENTRES = np.array([
+    (-23.55, -46.63), (-22.91, -43.17), (-19.92, -43.94), (-25.43, -49.27), (-30.03, -51.23),
+    (-12.97, -38.50), (-15.79, -47.88), (-8.05, -34.88), (-3.73, -38.52), (-16.68, -49.25),
+])
+CITY_WEIGHTS = np.array([0.38, 0.14, 0.09, 0.06, 0.05, 0.05, 0.04, 0.03, 0.03, 0.03])
+
+
+def synthetic_points(n_points, seed=0):
+    # customer_lat, customer_lng, distance_covered
+    rng = np.random.default_rng(seed)
+    centres = CITY_CENTRES[rng.choice(len(CITY_CENTRES), n_points, p=CITY_WEIGHTS / CITY_WEIGHTS.sum())]
+    points = centres + rng.normal(scale=1.5, size=(n_points, 2))
+    distance = np.abs(rng.normal(350, 250, n_points))
+    return np.column_stack([points, distance])
+
+
+def within_sum_of_squares(X, labels):
+    # Ward's objective: total squared distance of points to their cluster mean
+    return sum(((X[labels == c] - X[labels == c].mean(axis=0)) ** 2).sum() for c in np.unique(labels))
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and measure peak memory of ml_models.cluster_labels")
+    parser.add_argument("--points", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--max-points", type=int, default=2_000,
+                        help="Size above which scalable mode runs (the pages opt in at ml_models.CLUSTER_POINT_BUDGET)")
+    parser.add_argument("--n-clusters", type=int, default=3)
+    parser.add_argument("--compare-points", type=int, default=4_000,
+                        help="Size at which the scalable labels are compared with exact ward")
+    args = parser.parse_args(argv)
+
+    for n_points in args.points:
+        X = synthetic_points(n_points)
+        _, seconds, peak = measure(cluster_labels, X, args.n_clusters, args.max_points)
+        print(f"{n_points:>10,} points  {seconds:7.2f}s  peak {peak / 1024**2:8.1f} MiB  "
+              f"(input {X.nbytes / 1024**2:.1f} MiB, budget {args.max_points:,} points)")
+
+    X = synthetic_points(args.compare_points, seed=1)
+    exact = cluster_labels(X, args.n_clusters, max_points=None)
+    binned = cluster_labels(X, args.n_clusters, args.max_points)
+    print(f"Adjusted Rand index vs exact ward at {args.compare_points:,} points: "
+          f"{adjusted_rand_score(exact, binned):.3f}")
+    # Greedy ward can pick very different top splits of near-equal cost, so also compare objectives
+    print(f"Within-cluster sum of squares vs exact ward: "
+          f"{within_sum_of_squares(X, binned) / within_sum_of_squares(X, exact):.3f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import datetime as dt
+import time
+import numpy as np
+import pandas as pd
+from helper_funcs.cohorts import retention_matrix
+
+# Size of the Olist sample: order item rows and distinct customers
+OLIST_ROWS = 118_000
+OLIST_CUSTOMERS = 96_000
+
+
+def synthetic_orders(scale, seed=0):
+    rng = np.random.default_rng(seed)
+    n_rows = OLIST_ROWS * scale
+    # Most customers buy once, a few buy often
+    customers = rng.zipf(2.5, n_rows) % (OLIST_CUSTOMERS * scale)
+    minutes = rng.integers(0, 730 * 24 * 60, n_rows)
+    return pd.DataFrame({
+        "customer_unique_id": customers.astype(str),
+        "order_purchase_timestamp": pd.Timestamp("2016-09-01") + pd.to_timedelta(minutes, unit="min"),
+    })
+
+
+def legacy_retention_matrix(df):
+    # The per-row / per-group implementation this engine replaced, kept for comparison
+    customer_df = df.loc[:, ["customer_unique_id", "order_purchase_timestamp"]]
+    customer_df = customer_df[~customer_df.duplicated()]
+    customer_df["order_purchase_month"] = customer_df["order_purchase_timestamp"].apply(
+        lambda x: dt.datetime(x.year, x.month, 1))
+    customer_df["CohortMonth"] = customer_df.groupby("customer_unique_id")["order_purchase_month"].transform("min")
+    month, cohort = customer_df["order_purchase_month"], customer_df["CohortMonth"]
+    customer_df["CohortIndex"] = (month.dt.year - cohort.dt.year) * 12 + month.dt.month - cohort.dt.month + 1
+
+    cohort_data = customer_df.groupby(["CohortMonth", "CohortIndex"])["customer_unique_id"].apply(
+        pd.Series.nunique).reset_index()
+    cohort_counts = cohort_data.pivot(index="CohortMonth", columns="CohortIndex", values="customer_unique_id")
+    cohort_counts = cohort_counts.fillna(0)
+    return cohort_counts.divide(cohort_counts.iloc[:, 0], axis=0) * 100
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the cohort retention engine at multiples of the Olist size")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--legacy-max-scale", type=int, default=10,
+                        help="Also time the legacy implementation up to this scale")
+    args = parser.parse_args(argv)
+
+    for scale in args.scales:
+        df = synthetic_orders(scale)
+        matrix, seconds = timed(retention_matrix, df)
+        line = f"{scale:>4}x  {len(df):>12,} rows  engine {seconds:8.2f}s"
+
+        if scale <= args.legacy_max_scale:
+            legacy, legacy_seconds = timed(legacy_retention_matrix, df)
+            assert np.allclose(matrix.to_numpy(), legacy.to_numpy())
+            line += f"  legacy {legacy_seconds:8.2f}s  ({legacy_seconds / seconds:.0f}x)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+# What importing ml_models pulled in before sklearn and pycaret became lazy imports
+LEGACY_IMPORTS = [
+    "sklearn.preprocessing", "sklearn.pipeline", "sklearn.compose", "sklearn.model_selection",
+    "sklearn.linear_model", "sklearn.neighbors", "scipy.cluster.hierarchy", "sklearn.metrics",
+    "pycaret.classification", "streamlit", "pandas", "numpy", "plotly_express",
+]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{statements}
+seconds = time.perf_counter() - start
+print(seconds, int(any(name.split(".")[0] == "pycaret" for name in sys.modules)))
+"""
+
+
+def time_imports(statements, repeat):
+    # Each run is a fresh interpreter, so nothing is already in sys.modules
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, "-c", PROBE.format(statements=statements)],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        seconds, pycaret_loaded = result.stdout.split()
+        runs.append(float(seconds))
+    return statistics.median(runs), bool(int(pycaret_loaded))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time cold imports of the modules the pages load")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scorer", help="Also time loading this exported scorer through the model registry")
+    args = parser.parse_args(argv)
+
+    cases = {
+        "legacy ml_models imports": "\n".join(f"import {name}" for name in LEGACY_IMPORTS),
+        "helper_funcs.ml_models": "import helper_funcs.ml_models",
+        "helper_funcs.scoring": "import helper_funcs.scoring",
+    }
+    if args.scorer:
+        cases["ml_models + scorer load"] = (
+            f"import helper_funcs.ml_models\n"
+            f"from helper_funcs.model_registry import registry\n"
+            f"registry.get('churn_model', {args.scorer!r})"
+        )
+
+    for label, statements in cases.items():
+        seconds, detail = time_imports(statements, args.repeat)
+        if seconds is None:
+            print(f"{label:<28} failed: {detail}")
+        else:
+            print(f"{label:<28} {seconds:7.2f}s  pycaret imported: {'yes' if detail else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+DATA_ROOT = os.path.join(tempfile.gettempdir(), "olist-benchmarks")
+
+# Timings under this many seconds are too noisy to flag
+MIN_SECONDS = 0.05
+
+# app.COLUMNS (app.py renders the page when imported, so it is repeated here)
+PAGE_COLUMNS = [
+    "order_id", "order_status", "order_purchase_timestamp",
+    "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+    "product_id", "price", "freight_value", "payment_type", "product_category_name",
+    "seller_city", "seller_state", "customer_city", "customer_state",
+]
+
+
+def measure(func, setup, repeat):
+    # Best wall time over repeat runs, then one more run under tracemalloc for the peak allocation.
+    # setup() runs before every call and clears whatever cache would otherwise answer it.
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    setup()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "peak_mib": peak / 1024**2}
+
+
+def typical_filters(df):
+    # filter_widgets() outputs: the default state and the selections the dashboards see most
+    days = df["order_purchase_timestamp"]
+    first, last = days.min().date(), days.max().date()
+
+    def top(col, n):
+        return list(df[col].value_counts().index[:n])
+
+    nothing = [[] for _ in range(7)]
+    return {
+        "all": ["order_purchase_timestamp", first, last, *nothing],
+        "last_90_days": ["order_purchase_timestamp", (days.max() - pd.Timedelta(days=90)).date(), last, *nothing],
+        "state_category": ["order_purchase_timestamp", first, last, [], [], top("product_category_name", 3),
+                           [], [], [], top("customer_state", 2)],
+        "cities": ["order_delivered_customer_date", first, last, ["delivered"], [], [],
+                   top("seller_city", 5), [], top("customer_city", 10), []],
+    }
+
+
+def run_cases(repeat):
+    # Runs inside a worker whose OLIST_DATA_DIR points at one synthetic dataset
+    from helper_funcs import aggregations, backends, cohorts, cube, customers, data_parser, ml_models, st_filters
+
+    def clear_reads():
+        data_parser._read_data.clear()
+        data_parser._read_geo_index.clear()
+        data_parser._read_prefix_distances.clear()
+
+    results = {
+        "read_data": measure(lambda: data_parser.read_data(), clear_reads, repeat),
+        "read_data_geo": measure(lambda: data_parser.read_data(add_geo_location=True), clear_reads, repeat),
+    }
+
+    df = data_parser.read_data(add_geo_location=True)
+    version = data_parser.data_version(df, "benchmark")
+
+    # The General page's read: its column set for the default 90-day window
+    last = df["order_purchase_timestamp"].max().date()
+    last_90_days = (last - pd.Timedelta(days=90), last)
+    results["read_data[columns,last_90_days]"] = measure(
+        lambda: data_parser.read_data(columns=PAGE_COLUMNS, date_range=("order_purchase_timestamp", *last_90_days)),
+        clear_reads, repeat)
+
+    results["filter_index"] = measure(lambda: st_filters.filter_index(df, version),
+                                      st_filters.filter_indexes.clear, repeat)
+    for name, filters in typical_filters(df).items():
+        results[f"filter_data[{name}]"] = measure(lambda: st_filters.filter_data(df, version, *filters),
+                                                  st_filters.filter_results.clear, repeat)
+
+    # The Customer Analytics page's per-filter-state views
+    for name, filters in typical_filters(df).items():
+        rows = st_filters.filter_data(df, version, *filters)
+        results[f"customer_view[{name}]"] = measure(lambda: customers.customer_view(rows, version, filters),
+                                                    customers.customer_results.clear, repeat)
+
+    results["retention_matrix"] = measure(lambda: cohorts.retention_matrix(df), lambda: None, repeat)
+
+    geo_df = df[["customer_lat", "customer_lng", "distance_covered"]].copy()
+    results["cluster"] = measure(lambda: ml_models.cluster(3, geo_df, (version, "cluster"), max_points=ml_models.CLUSTER_POINT_BUDGET), ml_models.cluster_tree.clear, repeat)
+
+    results["build_cube"] = measure(lambda: cube.build_cube(df), lambda: None, repeat)
+    cube_df = cube.build_cube(df)
+    results["summarize"] = measure(lambda: aggregations.summarize(df, cube_df), lambda: None, repeat)
+
+    if backends.duckdb is not None:
+        duckdb_backend = backends.DuckDBBackend("benchmark")
+        for name, filters in typical_filters(df).items():
+            results[f"duckdb_summary[{name}]"] = measure(lambda: duckdb_backend.summary(filters),
+                                                         aggregations.summary_results.clear, repeat)
+
+    return {"rows": len(df), "cases": results}
+
+
+def dataset(scale, data_root):
+    from .synthetic import OLIST_ROWS, write_dataset
+
+    data_dir = os.path.join(data_root, f"{scale:g}x")
+    # customer_level.parquet is the last file write_dataset writes; products.parquet is missing from
+    # datasets generated before the star schema
+    if not all(os.path.exists(os.path.join(data_dir, name)) for name in ["products.parquet", "customer_level.parquet"]):
+        print(f"Generating {scale:g}x synthetic dataset in {data_dir}", file=sys.stderr)
+        write_dataset(data_dir, int(OLIST_ROWS * scale))
+    return data_dir
+
+
+def run_scale(scale, data_root, repeat):
+    # One fresh interpreter per scale: data paths are read at import and caches start empty
+    env = dict(os.environ, OLIST_DATA_DIR=dataset(scale, data_root))
+    result = subprocess.run([sys.executable, "-m", "benchmarks.run", "--worker", "--repeat", str(repeat)],
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark worker failed at {scale:g}x:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, tolerance):
+    # Print every case against the baseline and return the regressions
+    regressions = []
+    for scale, run in results.items():
+        print(f"\n{scale} ({run['rows']:,} rows)")
+        print(f"  {'case':<32}{'seconds':>10}{'baseline':>10}{'peak MiB':>10}{'baseline':>10}")
+        for case, now in run["cases"].items():
+            before = baseline.get(scale, {}).get("cases", {}).get(case)
+            line = f"  {case:<32}{now['seconds']:>10.3f}"
+            if before is None:
+                print(line + f"{'-':>10}{now['peak_mib']:>10.1f}{'-':>10}")
+                continue
+            line += f"{before['seconds']:>10.3f}{now['peak_mib']:>10.1f}{before['peak_mib']:>10.1f}"
+            slower = (now["seconds"] > before["seconds"] * tolerance
+                      and now["seconds"] - before["seconds"] > MIN_SECONDS)
+            bigger = now["peak_mib"] > before["peak_mib"] * tolerance and now["peak_mib"] - before["peak_mib"] > 1
+            if slower or bigger:
+                regressions.append(f"{scale} {case}")
+                line += "  REGRESSION"
+            print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run",
+        description="Time the data loading, filtering, cohort, clustering and aggregation paths on "
+                    "synthetic data and compare against a stored baseline")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 5],
+                        help="Dataset sizes as multiples of the Olist sample")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-root", default=DATA_ROOT, help="Where synthetic datasets are generated and reused")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=1.3,
+                        help="Flag cases slower or larger than this multiple of the baseline")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_cases(args.repeat)))
+        return
+
+    results = {f"{scale:g}x": run_scale(scale, args.data_root, args.repeat) for scale in args.scales}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"machine": {"platform": platform.platform(), "python": platform.python_version(),
+                                   "cpus": os.cpu_count()},
+                       "results": results}, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance}x the baseline: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from helper_funcs.cube import build_cube
+from helper_funcs.data_parser import ID_COLS, STAR_COLS, partition_dir, read_payment_types, read_star
+from helper_funcs.etl import (COMPACT_DTYPES, ROW_GROUP_ROWS, build_distances, build_geo_index, month_partitions,
+                              star_tables, write_customer_level)
+
+# Size of the Olist sample: order item rows
+OLIST_ROWS = 118_000
+
+# State, share of customers, share of sellers, first and last 3-digit CEP prefix (zip prefix // 100),
+# rough centroid (lat, lng)
+STATES = [
+    ("SP", 0.420, 0.600, 10, 199, -23.0, -47.5),
+    ("RJ", 0.130, 0.055, 200, 289, -22.5, -43.0),
+    ("MG", 0.117, 0.080, 300, 399, -19.0, -44.5),
+    ("RS", 0.055, 0.040, 900, 999, -30.0, -52.5),
+    ("PR", 0.051, 0.090, 800, 879, -25.0, -51.0),
+    ("SC", 0.037, 0.060, 880, 899, -27.3, -50.2),
+    ("BA", 0.034, 0.012, 400, 489, -12.5, -41.5),
+    ("DF", 0.021, 0.010, 700, 727, -15.8, -47.9),
+    ("ES", 0.020, 0.008, 290, 299, -19.6, -40.6),
+    ("GO", 0.020, 0.015, 728, 767, -16.0, -49.5),
+    ("PE", 0.017, 0.008, 500, 569, -8.4, -37.0),
+    ("CE", 0.013, 0.004, 600, 639, -5.2, -39.5),
+    ("PA", 0.010, 0.002, 660, 688, -3.5, -52.0),
+    ("MT", 0.009, 0.004, 780, 788, -13.0, -56.0),
+    ("MA", 0.008, 0.002, 650, 659, -5.0, -45.0),
+    ("MS", 0.007, 0.002, 790, 799, -20.5, -54.5),
+    ("PB", 0.005, 0.002, 580, 589, -7.1, -36.8),
+    ("PI", 0.005, 0.002, 640, 649, -7.5, -42.5),
+    ("RN", 0.005, 0.002, 590, 599, -5.8, -36.5),
+    ("AL", 0.004, 0.001, 570, 579, -9.6, -36.6),
+    ("SE", 0.003, 0.001, 490, 499, -10.6, -37.4),
+    ("TO", 0.003, 0.001, 770, 779, -10.2, -48.3),
+    ("RO", 0.003, 0.001, 768, 769, -10.9, -62.8),
+    ("AM", 0.002, 0.001, 690, 692, -3.1, -60.0),
+    ("AC", 0.001, 0.0005, 699, 699, -9.0, -70.0),
+    ("AP", 0.001, 0.0005, 689, 689, 0.9, -51.5),
+    ("RR", 0.001, 0.0005, 693, 693, 2.8, -60.7),
+]
+
+# English category names, most popular first (the processed frame is already translated)
+CATEGORIES = [
+    "bed_bath_table", "health_beauty", "sports_leisure", "furniture_decor", "computers_accessories",
+    "housewares", "watches_gifts", "telephony", "garden_tools", "auto", "toys", "cool_stuff",
+    "perfumery", "baby", "electronics", "stationery", "fashion_bags_accessories", "pet_shop",
+    "office_furniture", "consoles_games", "luggage_accessories", "construction_tools_construction",
+    "home_appliances", "musical_instruments", "small_appliances", "home_construction", "books_general_interest",
+    "food", "furniture_living_room", "home_confort", "drinks", "audio", "market_place",
+    "construction_tools_lights", "air_conditioning", "kitchen_dining_laundry_garden_furniture",
+    "food_drink", "industry_commerce_and_business", "books_technical", "fixed_telephony",
+    "costruction_tools_garden", "art", "computers", "signaling_and_security", "christmas_supplies",
+    "fashion_shoes", "dvds_blu_ray", "music", "tablets_printing_image", "cine_photo",
+]
+
+ORDER_STATUSES = ["delivered", "shipped", "canceled", "unavailable", "invoiced", "processing",
+                  "created", "approved"]
+STATUS_WEIGHTS = [0.970, 0.011, 0.006, 0.006, 0.003, 0.003, 0.0005, 0.0005]
+
+PAYMENT_TYPES = ["credit_card", "boleto", "voucher", "debit_card"]
+PAYMENT_WEIGHTS = [0.74, 0.19, 0.055, 0.015]
+
+START = pd.Timestamp("2016-09-04")
+PERIOD_DAYS = 730
+# Like Olist, about 3% of orders come from returning customers
+REPEAT_SHARE = 0.03
+
+TRANSLATION_PATH = "assets/data/product_category_name_translation.csv"
+
+STATE_NAMES = [state[0] for state in STATES]
+STATE_LO = np.array([state[3] for state in STATES])
+STATE_HI = np.array([state[4] for state in STATES])
+STATE_LAT = np.array([state[5] for state in STATES])
+STATE_LNG = np.array([state[6] for state in STATES])
+
+# Cities are named after their 3-digit CEP region; fixed category lists keep the dictionary
+# encoding identical across parquet chunks
+CITIES = [f"{state[0].lower()} city {region}" for state in STATES for region in range(state[3], state[4] + 1)]
+CITY_CODES = np.full(1000, -1)
+CITY_CODES[[region for state in STATES for region in range(state[3], state[4] + 1)]] = np.arange(len(CITIES))
+CATEGORY_VALUES = {
+    "order_status": ORDER_STATUSES,
+    "payment_type": PAYMENT_TYPES,
+    "product_category_name": CATEGORIES,
+    "seller_city": CITIES,
+    "seller_state": STATE_NAMES,
+    "customer_city": CITIES,
+    "customer_state": STATE_NAMES,
+}
+
+
+def normalize(weights):
+    weights = np.asarray(weights, dtype=float)
+    return weights / weights.sum()
+
+
+def cumulative(weights):
+    weights = np.cumsum(np.asarray(weights, dtype=float))
+    return weights / weights[-1]
+
+
+CUSTOMER_STATE_CDF = cumulative([state[1] for state in STATES])
+SELLER_STATE_CDF = cumulative([state[2] for state in STATES])
+CATEGORY_CDF = cumulative(1 / np.arange(1, len(CATEGORIES) + 1) ** 0.9)
+
+
+def mix(codes, salt):
+    # splitmix64: entity attributes are a pure function of the entity code, so every chunk agrees on
+    # a customer's state or a product's price without keeping entity tables in memory
+    z = np.asarray(codes, dtype=np.uint64) + np.uint64(salt * 0x632BE59BD9B4E019 % 2**64)
+    z = z + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def uniform(codes, salt):
+    return (mix(codes, salt) >> np.uint64(11)).astype(np.float64) / 2.0**53
+
+
+def normal(codes, salt):
+    # Box-Muller on two hashed uniforms
+    u1, u2 = 1 - uniform(codes, salt), uniform(codes, salt + 1)
+    return np.sqrt(-2 * np.log(u1)) * np.cos(2 * np.pi * u2)
+
+
+def hex_ids(codes, salt):
+    # Olist-looking 32 character hex ids, stable per code
+    words = np.column_stack([mix(codes, salt), mix(codes, salt + 1)]).astype(">u8")
+    return np.frombuffer(words.tobytes().hex().encode("ascii"), dtype="S32").astype(str)
+
+
+def place(codes, salt, state_cdf):
+    # State, zip prefix and city of customers or sellers; regions are skewed towards the capital
+    states = np.minimum(np.searchsorted(state_cdf, uniform(codes, salt), side="right"), len(STATES) - 1)
+    lo, hi = STATE_LO[states], STATE_HI[states]
+    region = lo + ((hi - lo + 1) * uniform(codes, salt + 1) ** 3).astype(np.int64)
+    prefixes = (region * 100 + (100 * uniform(codes, salt + 2)).astype(np.int64)).astype(np.int32)
+    return states, prefixes, CITY_CODES[region]
+
+
+def categorical(codes, col):
+    return pd.Categorical.from_codes(codes, categories=CATEGORY_VALUES[col])
+
+
+def seller_columns(sellers):
+    states, prefixes, cities = place(sellers, 40, SELLER_STATE_CDF)
+    return {"seller_zip_code_prefix": prefixes, "seller_city": categorical(cities, "seller_city"),
+            "seller_state": categorical(states, "seller_state")}
+
+
+def product_columns(products):
+    category = np.searchsorted(CATEGORY_CDF, uniform(products, 32), side="right")
+    return {"product_category_name": categorical(category, "product_category_name")}
+
+
+# Salt of each id column's hex ids
+ID_SALTS = {"order_id": 1, "customer_id": 3, "product_id": 5, "seller_id": 7, "customer_unique_id": 9}
+
+
+class Universe:
+    # Entity counts for a dataset of n_rows order item rows
+    def __init__(self, n_rows):
+        n_orders = max(int(n_rows / 1.15), 1)
+        self.n_orders = n_orders
+        self.repeat_pool = max(int(n_orders * REPEAT_SHARE), 1)
+        self.n_sellers = int(np.clip(n_rows // 38, 10, 500_000))
+        self.n_products = int(np.clip(n_rows // 3, 10, 5_000_000))
+
+
+def orders_chunk(universe, first_order, n_orders, rng):
+    # Order item rows for orders first_order .. first_order + n_orders - 1, in the
+    # joined row schema etl splits into the star tables: skewed states, cities and categories, repeat customers, volume
+    # growing over time, and delivery delays that grow with distance from SP. The id columns hold the
+    # entity codes themselves, as surrogate keys into the dictionaries of write_ids.
+    orders = np.arange(first_order, first_order + n_orders)
+    items = np.minimum(rng.geometric(0.87, n_orders), 20)
+    order_rows = np.repeat(np.arange(n_orders), items)
+    n_rows = len(order_rows)
+
+    # Customers: a returning order belongs to one of a small pool of customers
+    returning = uniform(orders, 10) < REPEAT_SHARE
+    customers = np.where(returning, (uniform(orders, 11) * universe.repeat_pool).astype(np.int64), orders)
+    customer_states, customer_zip, customer_city = place(customers, 20, CUSTOMER_STATE_CDF)
+
+    # Order codes follow purchase time (as the ETL writes the orders in purchase order), so chunks
+    # fill one month partition after another and row groups cover narrow date ranges
+    position = np.minimum((orders + rng.random(n_orders)) / universe.n_orders, 1)
+    purchase = START + pd.to_timedelta(np.sqrt(position) * PERIOD_DAYS * 86400, unit="s").floor("s")
+    approved = purchase + pd.to_timedelta(rng.exponential(10, n_orders), unit="h").floor("s")
+    carrier = approved + pd.to_timedelta(rng.exponential(2.5, n_orders), unit="D").floor("s")
+    transit_days = 4 + np.abs(STATE_LAT[customer_states] + 23) * 0.6 + rng.gamma(2.0, 2.5, n_orders)
+    delivered = carrier + pd.to_timedelta(transit_days, unit="D").floor("s")
+    estimated = (purchase + pd.to_timedelta(rng.integers(15, 35, n_orders), unit="D")).floor("D")
+    status = rng.choice(len(ORDER_STATUSES), n_orders, p=normalize(STATUS_WEIGHTS))
+    delivered = delivered.where(status == 0)
+    carrier = carrier.where(status <= 1)
+    payment_type = rng.choice(len(PAYMENT_TYPES), n_orders, p=normalize(PAYMENT_WEIGHTS))
+    installments = np.where(payment_type == 0, rng.integers(1, 11, n_orders), 1)
+
+    # Items: a few products sell most; price, category and seller belong to the product
+    products = (universe.n_products * rng.random(n_rows) ** 3).astype(np.int64)
+    price = np.round(np.exp(4.3 + 0.9 * normal(products, 30)), 2)
+    sellers = (universe.n_sellers * uniform(products, 33) ** 2).astype(np.int64)
+    freight = np.round(np.exp(rng.normal(2.8, 0.5, n_rows)), 2)
+    item_ids = np.arange(n_rows) - np.searchsorted(order_rows, order_rows) + 1
+    order_totals = np.bincount(order_rows, weights=price + freight, minlength=n_orders)
+
+    return pd.DataFrame({
+        "order_id": orders[order_rows],
+        "customer_id": orders[order_rows],
+        "order_status": categorical(status[order_rows], "order_status"),
+        "order_purchase_timestamp": purchase[order_rows],
+        "order_approved_at": approved[order_rows],
+        "order_delivered_carrier_date": carrier[order_rows],
+        "order_delivered_customer_date": delivered[order_rows],
+        "order_estimated_delivery_date": estimated[order_rows],
+        "order_item_id": item_ids,
+        "product_id": products,
+        "seller_id": sellers,
+        "shipping_limit_date": (approved + pd.Timedelta(days=6))[order_rows],
+        "price": price,
+        "freight_value": freight,
+        **seller_columns(sellers),
+        "payment_sequential": 1,
+        "payment_type": categorical(payment_type[order_rows], "payment_type"),
+        "payment_installments": installments[order_rows],
+        "payment_value": np.round(order_totals, 2)[order_rows],
+        "customer_unique_id": customers[order_rows],
+        "customer_zip_code_prefix": customer_zip[order_rows],
+        "customer_city": categorical(customer_city[order_rows], "customer_city"),
+        "customer_state": categorical(customer_states[order_rows], "customer_state"),
+        **product_columns(products),
+    }).astype({**{col: "int32" for col in ID_COLS}, **COMPACT_DTYPES})
+
+
+def generate_orders(n_rows, chunk_rows=1_000_000, seed=0):
+    # Yields order item frames of about chunk_rows rows until exactly n_rows have been produced;
+    # only one chunk is in memory at a time
+    universe = Universe(n_rows)
+    orders_per_chunk = max(int(chunk_rows / 1.15), 1)
+    first_order, produced, chunk_no = 0, 0, 0
+    while produced < n_rows:
+        # Near the end, generate only a little more than the rows still needed, then trim
+        n_orders = min(orders_per_chunk, int((n_rows - produced) / 1.1) + 10)
+        rng = np.random.default_rng([seed, chunk_no])
+        chunk = orders_chunk(universe, first_order, n_orders, rng).iloc[:n_rows - produced]
+        yield chunk
+        produced += len(chunk)
+        first_order += n_orders
+        chunk_no += 1
+
+
+def orders_frame(n_rows, seed=0):
+    return pd.concat(generate_orders(n_rows, seed=seed), ignore_index=True)
+
+
+class TableWriter:
+    # Streams frames into one parquet file; the first frame fixes the schema
+    def __init__(self, path, columns):
+        self.path, self.columns = path, columns
+        self.schema = self.writer = None
+
+    def table(self, rows):
+        table = pa.Table.from_pandas(rows[self.columns], preserve_index=False)
+        self.schema = self.schema or table.schema
+        return table.cast(self.schema)
+
+    def open(self, path):
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, df):
+        table = self.table(df)
+        if self.writer is None:
+            self.open(self.path)
+        self.writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class MonthWriter(TableWriter):
+    # The month-partitioned layout of etl.write_months, streamed: chunks arrive in purchase order, so
+    # each month's file is open until the first row of the next month
+    def __init__(self, path, columns):
+        super().__init__(path, columns)
+        self.month = None
+        shutil.rmtree(path, ignore_errors=True)
+
+    def write(self, df):
+        for year, month, rows in month_partitions(df):
+            table = self.table(rows)
+            if (year, month) != self.month:
+                part_dir = partition_dir(self.path, year, month)
+                os.makedirs(part_dir)
+                self.open(os.path.join(part_dir, "part-0.parquet"))
+                self.month = (year, month)
+            self.writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+
+
+def write_star(data_dir, n_rows, chunk_rows=1_000_000, seed=0):
+    # The star schema tables of etl.write_star, streamed a chunk at a time. Orders never span chunks, so
+    # each chunk's facts, payments and customers are complete; sellers and products are written from
+    # their codes by write_dimensions. Returns the number of order codes.
+    writers = {table: MonthWriter(os.path.join(data_dir, table), STAR_COLS[table]) for table in ["orders", "items"]}
+    writers.update({table: TableWriter(os.path.join(data_dir, f"{table}.parquet"), STAR_COLS[table])
+                    for table in ["payments", "customers"]})
+    n_orders = 0
+    try:
+        for chunk in generate_orders(n_rows, chunk_rows, seed):
+            n_orders = max(n_orders, int(chunk["order_id"].max()) + 1)
+            tables = star_tables(chunk)
+            for table, writer in writers.items():
+                writer.write(tables[table])
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return n_orders
+
+
+def write_dimensions(data_dir, n_rows, chunk_rows=1_000_000):
+    # Every seller and product code with its attributes, a chunk at a time
+    universe = Universe(n_rows)
+    dimensions = {"sellers": (universe.n_sellers, seller_columns), "products": (universe.n_products, product_columns)}
+    for table, (size, columns) in dimensions.items():
+        writer = TableWriter(os.path.join(data_dir, f"{table}.parquet"), STAR_COLS[table])
+        try:
+            for start in range(0, size, chunk_rows):
+                codes = np.arange(start, min(start + chunk_rows, size))
+                writer.write(pd.DataFrame({STAR_COLS[table][0]: codes.astype("int32"), **columns(codes)}))
+        finally:
+            writer.close()
+
+
+def write_ids(ids_dir, n_rows, n_orders, chunk_rows=1_000_000):
+    # The dictionaries of etl.encode_ids: the hex id of every entity code, a chunk at a time
+    universe = Universe(n_rows)
+    sizes = {"order_id": n_orders, "customer_id": n_orders, "product_id": universe.n_products,
+             "seller_id": universe.n_sellers, "customer_unique_id": max(n_orders, universe.repeat_pool)}
+    os.makedirs(ids_dir, exist_ok=True)
+    for col, size in sizes.items():
+        with pq.ParquetWriter(os.path.join(ids_dir, f"{col}.parquet"), pa.schema([(col, pa.string())])) as writer:
+            for start in range(0, size, chunk_rows):
+                codes = np.arange(start, min(start + chunk_rows, size))
+                writer.write_table(pa.table({col: hex_ids(codes, ID_SALTS[col])}))
+
+
+def geolocation_points(state, seed=0):
+    # Raw olist_geolocation_dataset rows for one state: several noisy points per zip prefix around
+    # a centroid that moves across the state by CEP region, plus a few bad coordinates as in Olist
+    rng = np.random.default_rng([seed, state])
+    lo, hi = STATE_LO[state], STATE_HI[state]
+    prefixes = np.arange(lo * 100, (hi + 1) * 100)
+    spread = (prefixes // 100 - lo) / max(hi - lo, 1) - 0.5
+    points = np.repeat(prefixes, rng.poisson(4, len(prefixes)) + 1)
+    at = np.searchsorted(prefixes, points)
+
+    lat = STATE_LAT[state] + spread[at] * 3 + (points % 100) * 0.005 + rng.normal(0, 0.02, len(points))
+    lng = STATE_LNG[state] + spread[at] * 3 - (points % 100) * 0.005 + rng.normal(0, 0.02, len(points))
+    bad = rng.random(len(points)) < 0.0005
+    lat[bad], lng[bad] = rng.uniform(-10, 45, bad.sum()), rng.uniform(-10, 10, bad.sum())
+
+    return pd.DataFrame({
+        "geolocation_zip_code_prefix": points,
+        "geolocation_lat": lat,
+        "geolocation_lng": lng,
+        "geolocation_city": np.array(CITIES)[CITY_CODES[points // 100]],
+        "geolocation_state": STATE_NAMES[state],
+    })
+
+
+def write_geolocation(path, seed=0):
+    # Written one state at a time
+    for state in range(len(STATES)):
+        geolocation_points(state, seed).to_csv(path, mode="w" if state == 0 else "a",
+                                               header=state == 0, index=False)
+
+
+def write_translation(path):
+    # The category translation table is public Olist metadata, not customer data
+    translation = pd.read_csv(TRANSLATION_PATH, encoding="utf-8-sig")
+    translation[translation["product_category_name_english"].isin(CATEGORIES)].to_csv(path, index=False)
+
+
+def write_dataset(data_dir, n_rows, chunk_rows=1_000_000, seed=0, derive=True):
+    # The star schema tables plus the inputs etl reads next to them: the raw geolocation points and the
+    # category translation, then the zip prefix centroids built from them. With derive, also the
+    # cube, prefix distances and customer-level table, which load the item rows in memory.
+    os.makedirs(data_dir, exist_ok=True)
+    n_orders = write_star(data_dir, n_rows, chunk_rows, seed)
+    write_dimensions(data_dir, n_rows, chunk_rows)
+    write_ids(os.path.join(data_dir, "ids"), n_rows, n_orders, chunk_rows)
+    write_geolocation(os.path.join(data_dir, "geolocation_dataset.csv"), seed)
+    write_translation(os.path.join(data_dir, "product_category_name_translation.csv"))
+    index = build_geo_index(data_dir)
+
+    if derive:
+        items = read_star(data_dir)
+        payments = read_payment_types(os.path.join(data_dir, "payments.parquet"))
+        build_cube(items, payments).to_parquet(os.path.join(data_dir, "orders_cube.parquet"), index=False)
+        build_distances(items, index, data_dir)
+        write_customer_level(items, data_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.synthetic",
+        description="Write a synthetic dataset in the Olist schema for scale and load testing")
+    parser.add_argument("data_dir")
+    parser.add_argument("--rows", type=int, default=OLIST_ROWS, help="Order item rows, e.g. 1_000_000 to 100_000_000")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows generated and written at a time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-derive", dest="derive", action="store_false",
+                        help="Skip the cube, prefix distances and customer-level table (they need the item rows in memory)")
+    args = parser.parse_args(argv)
+
+    write_dataset(args.data_dir, args.rows, args.chunk_rows, args.seed, args.derive)
+    print(f"Wrote {args.rows:,} order item rows to {args.data_dir}")
+
+
+if __name__ == "__main__":
+    main()
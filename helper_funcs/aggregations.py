@@ -0,0 +1,68 @@
+import pandas as pd
+from .cube import filtered_cube
+from .data_parser import get_freq
+from .result_cache import ResultCache
+from .st_filters import filter_key
+
+
+METRICS = ["price", "num_products"]
+
+# Trend views are keyed by their selectbox label; frequencies come from data_parser.get_freq
+TREND_FREQS = ["Daily", "Weekly", "Monthly"]
+
+
+def resample(daily, key, freq, by=(), metrics=METRICS):
+    return daily.groupby(by=[pd.Grouper(key=key, freq=freq), *by], observed=True)[metrics].sum().reset_index()
+
+
+def summarize(df, cube_df):
+    # Every summary the dashboards plot for one filter state, from the filtered rows and their
+    # cube-shaped roll-up
+
+    # City views need row-level detail the cube doesn't keep
+    cities = {
+        col: df.groupby(by=col, observed=True).agg(
+            price=("price", "sum"), num_products=("product_id", "count")).reset_index()
+        for col in ["customer_city", "seller_city"]
+    }
+
+    return assemble(cube_df, cities)
+
+
+def assemble(cube_df, cities):
+    # The summary bundle from its row-level parts. The cube-shaped frame is rolled up once to
+    # day x status and state pairs, and coarser views are derived from those small frames.
+    daily = cube_df.groupby(["order_purchase_timestamp", "order_status"], observed=True)[METRICS].sum().reset_index()
+    state_pairs = cube_df.groupby(["seller_state", "customer_state"], observed=True)[METRICS].sum().reset_index()
+
+    return {
+        "overall": cube_df[METRICS].sum(),
+        "monthly": resample(daily, "order_purchase_timestamp", "MS", by=["order_status"]),
+        "trend": {freq: resample(daily, "order_purchase_timestamp", get_freq(freq), by=["order_status"])
+                  for freq in TREND_FREQS},
+        "state_pairs": state_pairs,
+        "states": {col: state_pairs.groupby(by=col, observed=True)[METRICS].sum().reset_index()
+                   for col in ["customer_state", "seller_state"]},
+        "cities": cities,
+        "categories": cube_df.groupby(by="product_category_name", observed=True)[METRICS].sum().reset_index(),
+    }
+
+
+def bundle_bytes(summary):
+    total = 0
+    for value in summary.values():
+        for frame in (value.values() if isinstance(value, dict) else [value]):
+            total += int(frame.memory_usage(index=True).sum()) if hasattr(frame, "columns") else 0
+    return total
+
+
+summary_results = ResultCache(max_entries=32, max_bytes=64 * 1024**2, sizeof=bundle_bytes)
+
+
+def summaries(df, version, filters, add_freight=False):
+    # Cached summary bundle for a filter state; df is the filtered row-level frame
+    key = filter_key(version, filters) + (add_freight,)
+    summary = summary_results.get(key)
+    if summary is None:
+        summary = summary_results.put(key, summarize(df, filtered_cube(df, version, filters, add_freight)))
+    return summary
@@ -0,0 +1,207 @@
+import os
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+from . import aggregations, data_parser, st_filters
+from .cube import CUBE_DIMS
+from .etl import CATEGORY_COLS
+from .filter_index import DATE_COLS, FILTER_COLS
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+# "pandas" loads the orders into memory and filters them there; "duckdb" runs the filters and
+# aggregations as queries over the parquet files and only brings results into pandas
+BACKEND = os.environ.get("OLIST_BACKEND", "pandas")
+
+
+class PandasBackend:
+    # The in-memory path: the page's columns for the selected date range are read into a frame and
+    # filtered there through the FilterIndex
+
+    name = "pandas"
+
+    def __init__(self, *tags, add_freight=False, columns=None):
+        self.tags = tags
+        self.add_freight = add_freight
+        self.columns = columns
+        # Frame and version per date range: read_data hands out a fresh copy of its cached frame on
+        # every call, and a page opens its backend once per run
+        self.frames = {}
+
+    def filter_options(self):
+        return st_filters.sidebar_options()
+
+    def frame(self, filters):
+        # Rows of the filter state's date range (pushed down to the parquet reader) and their version
+        date_range = st_filters.date_range(filters)
+        if date_range not in self.frames:
+            df = data_parser.read_data(columns=self.columns, date_range=date_range)
+            if self.add_freight:
+                df["price"] = df["price"] + df["freight_value"]
+            self.frames[date_range] = df, data_parser.data_version(df, *self.tags, self.add_freight, *date_range)
+        return self.frames[date_range]
+
+    def rows(self, filters):
+        df, version = self.frame(filters)
+        return st_filters.filter_data(df, version, *filters)
+
+    def summary(self, filters):
+        df, version = self.frame(filters)
+        rows = st_filters.filter_data(df, version, *filters)
+        return aggregations.summaries(rows, version, filters, self.add_freight)
+
+    def activity(self, filters, date_col):
+        # Orders per distinct timestamp of date_col: the filtered rows' order keys, looked up in the
+        # orders of the filter state's date range
+        keys = np.unique(self.rows(filters)["order_id"].to_numpy())
+        orders = data_parser.read_orders(columns=["order_id", date_col], date_range=st_filters.date_range(filters))
+        orders = data_parser.lookup(orders, "order_id", keys)
+        return orders.groupby(date_col).agg(num_orders=("order_id", "count")).reset_index()
+
+
+class DuckDBBackend:
+    # Filters and aggregates with DuckDB directly over the star schema files, scanning them on all cores.
+    # Nothing is loaded up front; results are cached per filter state like the pandas path.
+
+    name = "duckdb"
+
+    def __init__(self, *tags, add_freight=False, columns=None, data_dir=None):
+        self.data_dir = data_dir or data_parser.DATA_DIR
+        self.add_freight = add_freight
+        self.columns = columns
+        self.version = (data_parser.dataset_version(self.data_dir), self.name) + tags + (add_freight,)
+        self.connection = connection(self.data_dir)
+
+    def query(self, sql, params=()):
+        # A cursor per query: DuckDB connections must not be shared between threads
+        return self.connection.cursor().execute(sql, list(params)).fetchdf()
+
+    def where(self, filters):
+        date_col, start_date, end_date, selections = st_filters.split_filters(filters)
+        # Inclusive calendar days, as FilterIndex.date_mask
+        clauses = [f"{date_col} >= ?", f"{date_col} < ?"]
+        params = [pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)]
+        months = pd.period_range(start_date, end_date, freq="M")
+        if date_col == "order_purchase_timestamp" and len(months) > 0:
+            # The months as (year, month) pairs: DuckDB prunes the other months' files on this form, not
+            # on arithmetic over the partition columns
+            clauses.append(f"(purchase_year, purchase_month) IN ({', '.join(['(?, ?)'] * len(months))})")
+            params.extend(value for month in months for value in (month.year, month.month))
+        for col, selected in selections.items():
+            if len(selected) > 0:
+                values = ", ".join("?" * len(selected))
+                # Orders with any payment of the selected types, as FilterIndex matches them
+                clauses.append(f"order_id IN (SELECT order_id FROM payments WHERE payment_type IN ({values}))"
+                               if col == "payment_type" else f"{col} IN ({values})")
+                params.extend(str(value) for value in selected)
+        return " AND ".join(clauses), params
+
+    def source(self, filters, *columns):
+        # The item rows joined with only the tables holding columns or a filtered column
+        date_col, _, _, selections = st_filters.split_filters(filters)
+        filtered = [col for col, selected in selections.items() if len(selected) > 0 and col != "payment_type"]
+        return source([date_col, *columns, *filtered])
+
+    def filter_options(self):
+        options = st_filters.filter_option_sets.get(self.version)
+        if options is None:
+            dates = ", ".join(f"min({col}) AS min_{col}, max({col}) AS max_{col}" for col in DATE_COLS)
+            values = ", ".join(f"list(DISTINCT {col}) FILTER (WHERE {col} IS NOT NULL) AS {col}"
+                               for col in FILTER_COLS if col != "payment_type")
+            result = self.query(f"SELECT {dates}, {values}, (SELECT list(DISTINCT payment_type) FILTER "
+                                f"(WHERE payment_type IS NOT NULL) FROM payments) AS payment_type "
+                                f"FROM {source(DATE_COLS + FILTER_COLS)}").iloc[0]
+            options = st_filters.filter_option_sets.put(self.version, {
+                "dates": {col: (result[f"min_{col}"].date(), result[f"max_{col}"].date()) for col in DATE_COLS},
+                "values": {col: list(result[col]) for col in FILTER_COLS},
+            })
+        return options
+
+    def rows(self, filters):
+        where, params = self.where(filters)
+        columns = self.columns or data_parser.ROW_COLS
+        df = self.query(f"SELECT {', '.join(columns)} FROM {self.source(filters, *columns)} "
+                        f"WHERE {where} ORDER BY filename, file_row_number", params)
+        if self.add_freight and {"price", "freight_value"} <= set(df.columns):
+            df["price"] = df["price"] + df["freight_value"]
+        return df.astype({col: "category" for col in CATEGORY_COLS if col in df.columns})
+
+    def summary(self, filters):
+        key = st_filters.filter_key(self.version, filters) + (self.add_freight,)
+        summary = aggregations.summary_results.get(key)
+        if summary is not None:
+            return summary
+
+        where, params = self.where(filters)
+        price = "price + freight_value" if self.add_freight else "price"
+        # The cube's cells without its payment types, which only the stored cube filters on, and with the
+        # metrics aggregations.assemble reads
+        dims = [col for col in CUBE_DIMS[1:] if col != "payment_types"]
+
+        cube_df = self.query(
+            f"SELECT date_trunc('day', order_purchase_timestamp) AS order_purchase_timestamp, {', '.join(dims)}, "
+            f"sum({price}) AS price, count(product_id) AS num_products "
+            f"FROM {self.source(filters, *dims, 'price', 'freight_value')} WHERE {where} GROUP BY ALL", params)
+        cities = {
+            col: self.query(f"SELECT {col}, sum({price}) AS price, count(product_id) AS num_products "
+                            f"FROM {self.source(filters, col, 'price', 'freight_value')} "
+                            f"WHERE {where} AND {col} IS NOT NULL GROUP BY ALL ORDER BY {col}", params)
+            for col in ["customer_city", "seller_city"]
+        }
+        summary = aggregations.assemble(cube_df, cities)
+        return aggregations.summary_results.put(key, summary)
+
+    def activity(self, filters, date_col):
+        where, params = self.where(filters)
+        return self.query(
+            f"SELECT {date_col}, count(DISTINCT order_id) AS num_orders FROM {self.source(filters, date_col)} "
+            f"WHERE {where} AND {date_col} IS NOT NULL GROUP BY ALL ORDER BY {date_col}", params)
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def connection(data_dir):
+    # One in-process DuckDB database per data directory, with a view per star schema table. Only the
+    # items view has the partition keys and each row's file position.
+    with _connections_lock:
+        if data_dir not in _connections:
+            con = duckdb.connect()
+            # Zero-padded months would otherwise be read as text
+            hive_types = ", ".join(f"'{col}': INTEGER" for col in data_parser.PARTITION_COLS)
+            for table, select in [("items", "*"), ("orders", f"* EXCLUDE ({', '.join(data_parser.PARTITION_COLS)})")]:
+                escaped = os.path.join(data_dir, table, "*", "*", "*.parquet").replace("'", "''")
+                con.execute(f"CREATE VIEW {table} AS SELECT {select} FROM read_parquet('{escaped}', "
+                            f"hive_partitioning = true, hive_types = {{{hive_types}}}, "
+                            f"filename = {table == 'items'}, file_row_number = {table == 'items'})")
+            for table in ["payments", "customers", "sellers", "products"]:
+                escaped = os.path.join(data_dir, f"{table}.parquet").replace("'", "''")
+                con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{escaped}')")
+            _connections[data_dir] = con
+        return _connections[data_dir]
+
+
+def source(columns):
+    # FROM clause of the item rows joined with the tables holding columns; customers join through orders
+    tables = [table for table in ["orders", "customers", "sellers", "products"]
+              if set(data_parser.STAR_COLS[table][1:]) & set(columns)]
+    if "customers" in tables and "orders" not in tables:
+        tables.insert(0, "orders")
+    return "items" + "".join(f" JOIN {table} USING ({data_parser.STAR_COLS[table][0]})" for table in tables)
+
+
+def open_backend(*tags, add_freight=False, columns=None):
+    # The configured backend for a page; columns is the page's column set. The pandas backend adds
+    # freight to the frame it loads, the DuckDB backend inside its queries.
+    if BACKEND == "duckdb":
+        if duckdb is not None:
+            return DuckDBBackend(*tags, add_freight=add_freight, columns=columns)
+        warnings.warn("OLIST_BACKEND=duckdb but duckdb is not installed; using pandas")
+
+    return PandasBackend(*tags, add_freight=add_freight, columns=columns)
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+from .result_cache import ResultCache
+from .st_filters import filter_key
+
+
+def retention_matrix(df, customer_col="customer_unique_id", date_col="order_purchase_timestamp"):
+    # Monthly cohort retention (%) without per-row Python calls: months become integer codes,
+    # customers are factorized, and distinct customers per (cohort, month offset) come from one
+    # bincount over the deduplicated (customer, month) pairs
+    data = df[[customer_col, date_col]].dropna()
+    customers, _ = pd.factorize(data[customer_col])
+    months = data[date_col].to_numpy().astype("datetime64[M]").astype(np.int64)
+    if len(months) == 0:
+        return pd.DataFrame()
+
+    first_month = months.min()
+    n_months = int(months.max() - first_month) + 1
+
+    # Sorted unique pairs: customer-major, so each customer's first pair holds their cohort month
+    pairs = np.unique(customers.astype(np.int64) * n_months + (months - first_month))
+    pair_customers, pair_months = np.divmod(pairs, n_months)
+    _, first_pair = np.unique(pair_customers, return_index=True)
+    cohorts = pair_months[first_pair][pair_customers]
+    offsets = pair_months - cohorts
+
+    counts = np.bincount(cohorts * n_months + offsets, minlength=n_months * n_months)
+    counts = counts.reshape(n_months, n_months)
+
+    # Keep the cohorts and offsets that occur, as a pivot of the same counts would
+    rows = np.flatnonzero(counts[:, 0])
+    cols = np.flatnonzero(counts.any(axis=0))
+    counts = counts[np.ix_(rows, cols)]
+
+    retention = pd.DataFrame(
+        counts / counts[:, :1] * 100,
+        index=pd.DatetimeIndex((rows + first_month).astype("datetime64[M]"), name="CohortMonth"),
+        columns=pd.Index(cols + 1, name="CohortIndex"),
+    )
+    return retention
+
+
+cohort_results = ResultCache(max_entries=16, max_bytes=32 * 1024**2)
+
+
+def retention(df, version, filters):
+    key = filter_key(version, filters)
+    matrix = cohort_results.get(key)
+    if matrix is None:
+        matrix = cohort_results.put(key, retention_matrix(df))
+    return matrix.copy(deep=False)
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from .data_parser import DATA_DIR, file_stamp, payment_type_sets
+from .result_cache import ResultCache
+from .st_filters import split_filters, filter_key
+
+
+CUBE_PATH = os.path.join(DATA_DIR, "orders_cube.parquet")
+
+# Day x status x payment types x category x seller state x customer state. The day is kept under the
+# order_purchase_timestamp name so the st_plots groupers work on cube and rows alike. payment_types is
+# the set of the order's payment types (data_parser.payment_type_sets), so each row is in one cell
+# yet a payment type filter matches every type of its order.
+CUBE_DIMS = ["order_purchase_timestamp", "order_status", "payment_types", "product_category_name",
+             "seller_state", "customer_state"]
+
+# Filters the cube can answer; city filters and other date columns need row-level data
+CUBE_FILTERS = ["order_status", "payment_type", "product_category_name", "seller_state", "customer_state"]
+
+
+def build_cube(df, payments=None):
+    # payments: (order_id, payment_type) pairs sorted by order, by default data_parser.read_payment_types().
+    # num_orders counts each order in the cell of its first row, so it sums over any roll-up. Under a
+    # category or seller state filter (the item-level dimensions) it counts the orders whose first item
+    # matches, where the rows would count orders with any matching item.
+    rows = df.assign(order_purchase_timestamp=df["order_purchase_timestamp"].dt.floor("D"),
+                     payment_types=payment_type_sets(df["order_id"], payments),
+                     first_item=~df["order_id"].duplicated())
+    cube = (
+        rows.groupby(CUBE_DIMS, observed=True, dropna=False)
+        .agg(price=("price", "sum"), freight_value=("freight_value", "sum"),
+             num_products=("product_id", "count"), num_orders=("first_item", "sum"))
+        .reset_index()
+    )
+    return cube
+
+
+def read_cube():
+    # Built by `python -m helper_funcs.etl build`
+    return _read_cube(CUBE_PATH, file_stamp(CUBE_PATH))
+
+
+@st.cache_data(show_spinner=False)
+def _read_cube(path, stamp):
+    if stamp is None:
+        return None
+    return pd.read_parquet(path)
+
+
+def query_cube(cube, filters, add_freight=False):
+    # Slice of the materialized cube for a filter state, or None when the cube can't answer it
+    date_col, start_date, end_date, selections = split_filters(filters)
+    if date_col != "order_purchase_timestamp" or any(
+            len(selected) > 0 for col, selected in selections.items() if col not in CUBE_FILTERS):
+        return None
+
+    days = cube["order_purchase_timestamp"]
+    mask = (days >= pd.Timestamp(start_date)) & (days <= pd.Timestamp(end_date))
+    for col in CUBE_FILTERS:
+        if len(selections[col]) > 0 and col == "payment_type":
+            selected = set(map(str, selections[col]))
+            mask &= cube["payment_types"].isin(
+                [types for types in pd.unique(cube["payment_types"]) if selected & set(types.split("|"))])
+        elif len(selections[col]) > 0:
+            mask &= cube[col].isin(selections[col])
+
+    sliced = cube.take(np.flatnonzero(mask))
+    if add_freight:
+        sliced = sliced.assign(price=sliced["price"] + sliced["freight_value"])
+    return sliced
+
+
+cube_results = ResultCache(max_entries=32, max_bytes=128 * 1024**2)
+
+
+def filtered_cube(df, version, filters, add_freight=False):
+    # Aggregates for a filter state: sliced from the ETL cube when possible, otherwise rolled up
+    # from the already filtered rows in df (whose price includes freight when add_freight is set)
+    key = filter_key(version, filters) + (add_freight,)
+    cube = cube_results.get(key)
+    if cube is None:
+        stored = read_cube()
+        if stored is not None:
+            cube = query_cube(stored, filters, add_freight)
+        if cube is None:
+            cube = build_cube(df)
+        cube_results.put(key, cube)
+    return cube
@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+from .aggregations import TREND_FREQS, resample
+from .data_parser import get_freq, payment_types
+from .result_cache import ResultCache
+from .st_filters import filter_key
+
+
+# Columns the Customer Analytics page relates churn to
+CHURN_COLS = ["payment_type", "customer_state", "seller_state", "product_category_name"]
+
+# Columns with one value per order that the customer views use
+ORDER_COLS = ["order_id", "customer_unique_id", "order_purchase_timestamp", "order_approved_at",
+              "order_delivered_customer_date"]
+
+
+def order_view(items):
+    # The orders with items in the filtered item rows, sorted by key, taken from their first item, with
+    # price summed over those items only (so a category filter keeps that category's revenue)
+    keys, first, positions = np.unique(items["order_id"].to_numpy(), return_index=True, return_inverse=True)
+    orders = items[ORDER_COLS].take(first).reset_index(drop=True)
+    orders["price"] = np.bincount(positions, weights=items["price"].to_numpy(), minlength=len(keys))
+    return orders
+
+
+def customer_table(orders):
+    # One row per customer, sorted by last purchase so churn windows are a searchsorted away
+    table = (
+        orders.groupby("customer_unique_id", observed=True)
+        .agg(first_purchase=("order_purchase_timestamp", "min"),
+             last_purchase=("order_purchase_timestamp", "max"),
+             order_count=("order_id", "count"),
+             revenue=("price", "sum"))
+        .reset_index()
+        .sort_values("last_purchase", kind="stable", ignore_index=True)
+    )
+    return table
+
+
+def churn_cutoff(table, churn_days):
+    # Customers whose last purchase is before this timestamp count as churned; None without customers
+    if len(table) == 0:
+        return None
+    return table["last_purchase"].iloc[-1] - pd.Timedelta(days=churn_days)
+
+
+def retained_customers(table, churn_days):
+    if len(table) == 0:
+        return 0
+    last_purchase = table["last_purchase"].to_numpy()
+    cutoff = churn_cutoff(table, churn_days).to_datetime64().astype(last_purchase.dtype)
+    return len(table) - int(np.searchsorted(last_purchase, cutoff, side="left"))
+
+
+def customer_positions(items, table):
+    # Position of each item row's customer in the customer table
+    keys = table["customer_unique_id"].to_numpy()
+    order = np.argsort(keys, kind="stable")
+    return order[np.searchsorted(keys[order], items["customer_unique_id"].to_numpy())]
+
+
+def churn_labels(table, positions, churn_days):
+    # 1 for the rows of churned customers, 0 for the retained. The table is sorted by last purchase,
+    # so the churned customers are the ones before the cutoff's searchsorted position.
+    churned = len(table) - retained_customers(table, churn_days)
+    return (positions < churned).astype(int)
+
+
+def churn_profile(customer_df, col, last_purchase):
+    # The last purchase of each row's customer, sorted within each value of col, so the churned share
+    # of rows per value is one searchsorted per value for any cutoff. A row counts under every payment
+    # type of its order.
+    rows, values = np.arange(len(customer_df)), customer_df[col]
+    if col == "payment_type":
+        rows, values = payment_types(customer_df["order_id"])
+    codes, uniques = pd.factorize(values)
+    timestamps = last_purchase[rows]
+    order = np.lexsort((timestamps, codes))
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return uniques, timestamps[order], bounds
+
+
+def churn_rates(profile, cutoff, col):
+    uniques, timestamps, bounds = profile
+    cutoff = cutoff.to_datetime64().astype(timestamps.dtype)
+    churned = np.array([np.searchsorted(timestamps[start:end], cutoff, side="left")
+                        for start, end in zip(bounds[:-1], bounds[1:])], dtype=float)
+    return pd.DataFrame({col: uniques, "Churn": churned / np.diff(bounds)})
+
+
+def delivered_rows(items):
+    # Delivered item rows in row order with each row's time since the first delivered purchase of its
+    # customer_unique_id and of its customer_id, so the renewal metrics are plain masks
+    delivered = items.loc[items["order_delivered_customer_date"].notnull(),
+                          ["customer_unique_id", "customer_id", "order_purchase_timestamp", "price"]]
+    for key in ["customer_unique_id", "customer_id"]:
+        first = delivered.groupby(key, observed=True)["order_purchase_timestamp"].transform("min")
+        delivered[f"{key}_gap"] = delivered["order_purchase_timestamp"] - first
+    return delivered
+
+
+def renewed_customers(delivered, window_days=365):
+    # Customers (customer_unique_id) with a delivered purchase within window_days of their first one,
+    # that first purchase included
+    window = delivered["customer_unique_id_gap"] < pd.Timedelta(days=window_days)
+    return delivered.loc[window, "customer_unique_id"].nunique()
+
+
+def renewal_revenue(delivered, window_days=365):
+    # Price of the delivered rows within window_days of their customer_id's first delivered purchase
+    window = delivered["customer_id_gap"] < pd.Timedelta(days=window_days)
+    return delivered.loc[window, "price"].sum()
+
+
+def customer_categories(items):
+    # Customers per category of their first filtered item; items are in purchase order, so that is the
+    # first occurrence of each customer key
+    _, first = np.unique(items["customer_unique_id"].to_numpy(), return_index=True)
+    return items.take(first).groupby(by="product_category_name", observed=True).agg(
+        num_customers=("customer_unique_id", "count")).reset_index()
+
+
+def customer_trend(orders):
+    # Orders (one customer each) per approval day, resampled for the trend selectbox
+    daily = orders.groupby(by=pd.Grouper(key="order_approved_at", freq="D")).agg(
+        Number_of_Customers=("customer_unique_id", "count")).reset_index()
+    return {freq: resample(daily, "order_approved_at", get_freq(freq), metrics=["Number_of_Customers"])
+            for freq in TREND_FREQS}
+
+
+customer_results = ResultCache(max_entries=16, max_bytes=512 * 1024**2,
+                               sizeof=lambda view: int(view["rows"].memory_usage(index=True).sum()))
+
+
+def customer_view(df, version, filters):
+    # Per filter state, from the filtered item rows: the customer table and each row's position in it,
+    # churn profiles, the delivered rows and the onboarding and category views. Orders and customers
+    # come from the grain tables rather than from deduplicating the rows.
+    key = filter_key(version, filters)
+    view = customer_results.get(key)
+    if view is None:
+        orders = order_view(df)
+        table = customer_table(orders)
+        positions = customer_positions(df, table)
+        last_purchase = table["last_purchase"].to_numpy()[positions]
+        view = customer_results.put(key, {
+            "rows": df,
+            "customers": table,
+            "positions": positions,
+            "profiles": {col: churn_profile(df, col, last_purchase) for col in CHURN_COLS},
+            "delivered": delivered_rows(df),
+            "categories": customer_categories(df),
+            "trend": customer_trend(orders),
+        })
+    return view
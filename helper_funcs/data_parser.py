@@ -1,8 +1,69 @@
 import pandas as pd
 import numpy as np
 import streamlit as st
+import hashlib
 import json
-from haversine import haversine, Unit
+import os
+import unicodedata
+from scipy import spatial
+from haversine import haversine_vector, Unit
+
+
+# Data files written by `python -m helper_funcs.etl build`; OLIST_DATA_DIR points the app at another
+# build, e.g. a synthetic dataset for benchmarks
+DATA_DIR = os.environ.get("OLIST_DATA_DIR", "assets/data")
+# Star schema: the order and order item facts are Hive-style datasets with one directory per purchase
+# month, e.g. items/purchase_year=2018/purchase_month=03/ (months are zero-padded, so path order is
+# purchase order); payments and the customer, seller and product dimensions are single files. Every
+# table is sorted by its key.
+ORDERS_PATH = os.path.join(DATA_DIR, "orders")
+ITEMS_PATH = os.path.join(DATA_DIR, "items")
+PAYMENTS_PATH = os.path.join(DATA_DIR, "payments.parquet")
+CUSTOMERS_PATH = os.path.join(DATA_DIR, "customers.parquet")
+SELLERS_PATH = os.path.join(DATA_DIR, "sellers.parquet")
+PRODUCTS_PATH = os.path.join(DATA_DIR, "products.parquet")
+PARTITION_COLS = ["purchase_year", "purchase_month"]
+
+# Columns of each table, key first. Orders carry their first payment's columns; payments holds them all,
+# and the payment type filter and churn profile read it (payment_types)
+STAR_COLS = {
+    "orders": ["order_id", "customer_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+               "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+               "payment_sequential", "payment_type", "payment_installments", "payment_value"],
+    "items": ["order_id", "order_item_id", "product_id", "seller_id", "shipping_limit_date", "price",
+              "freight_value"],
+    "payments": ["order_id", "payment_sequential", "payment_type", "payment_installments", "payment_value"],
+    "customers": ["customer_id", "customer_unique_id", "customer_zip_code_prefix", "customer_city",
+                  "customer_state"],
+    "sellers": ["seller_id", "seller_zip_code_prefix", "seller_city", "seller_state"],
+    "products": ["product_id", "product_category_name"],
+}
+# The row frame read_data returns: one row per order item, with the columns of its order, customer,
+# seller and product
+ROW_COLS = [
+    "order_id", "customer_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+    "order_delivered_carrier_date", "order_delivered_customer_date", "order_estimated_delivery_date",
+    "order_item_id", "product_id", "seller_id", "shipping_limit_date", "price", "freight_value",
+    "seller_zip_code_prefix", "seller_city", "seller_state", "payment_sequential", "payment_type",
+    "payment_installments", "payment_value", "customer_unique_id", "customer_zip_code_prefix",
+    "customer_city", "customer_state", "product_category_name",
+]
+
+# Customer-level table written by the same build: one row per customer, sorted by customer key
+CUSTOMER_LEVEL_PATH = os.path.join(DATA_DIR, "customer_level.parquet")
+# The hex id columns are stored as int32 surrogate keys; ids/<col>.parquet holds each key's id at
+# row position key
+ID_COLS = ["order_id", "customer_id", "product_id", "seller_id", "customer_unique_id"]
+IDS_PATH = os.path.join(DATA_DIR, "ids")
+GEO_INDEX_PATH = os.path.join(DATA_DIR, "geolocation_index.parquet")
+# Columns read_dataset locates customers and sellers by
+GEO_COLS = ["customer_zip_code_prefix", "customer_city", "customer_state",
+            "seller_zip_code_prefix", "seller_city", "seller_state"]
+DISTANCES_PATH = os.path.join(DATA_DIR, "prefix_distances.parquet")
+# Single files of a build that dataset_version covers besides the fact partitions (not churn_scores,
+# which the scoring job rewrites on its own schedule)
+DATASET_FILES = ["payments", "customers", "sellers", "products", "customer_level", "orders_cube",
+                 "geolocation_index", "prefix_distances"]
 
 
 def clean_format(num):
@@ -21,60 +82,327 @@ def get_freq(input):
     return freq_dict[input]
 
 
+def distance_miles(origins, destinations):
+    # Great-circle distance for every (lat, lng) row pair in one batched NumPy call
+    if len(origins) == 0:
+        return np.empty(0)
+    return haversine_vector(np.asarray(origins, dtype=float), np.asarray(destinations, dtype=float),
+                            unit=Unit.MILES)
+
+
+def city_keys(names):
+    # Lowercase, accent-free city names: the geolocation table spells cities with accents ("são paulo"),
+    # the customer and seller tables mostly without ("sao paulo")
+    codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+    keys = np.array([unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().lower().strip()
+                     for name in uniques] + [""], dtype=object)
+    return keys[codes]
+
+
+def unit_vectors(lat, lng):
+    # Points on the unit sphere, so Euclidean nearest neighbours are great-circle nearest neighbours
+    lat, lng = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lng, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)])
+
+
+def nearest_prefixes(prefixes, cities, states, geo_index):
+    # Row position in geo_index of the centroid that locates each zip prefix: the prefix's own when it
+    # is indexed. A missing prefix has no coordinates of its own, so it takes the indexed prefix
+    # nearest (KD-tree over the centroids) to the centre of the row's city, or of its state when the
+    # city has no indexed prefix, searching only that city's or state's prefixes.
+    known = geo_index["zip_code_prefix"].to_numpy()
+    prefixes = np.asarray(prefixes, dtype=known.dtype)
+    at = np.minimum(np.searchsorted(known, prefixes), len(known) - 1)
+    positions = np.where(known[at] == prefixes, at, -1)
+
+    missing = np.flatnonzero(positions < 0)
+    if len(missing) == 0:
+        return positions
+
+    points = unit_vectors(geo_index["lat"], geo_index["lng"])
+    index_cities, index_states = geo_index["city"].to_numpy(dtype=object), geo_index["state"].to_numpy(dtype=object)
+    places = pd.DataFrame({"city": city_keys(pd.Series(cities).take(missing).to_numpy(dtype=object)),
+                           "state": pd.Series(states).take(missing).to_numpy(dtype=object)})
+    codes, uniques = pd.factorize(pd.MultiIndex.from_frame(places))
+    nearest = np.empty(len(uniques), dtype=positions.dtype)
+    for code, (city, state) in enumerate(uniques):
+        candidates = np.flatnonzero((index_cities == city) & (index_states == state))
+        if len(candidates) == 0:
+            candidates = np.flatnonzero(index_states == state)
+        if len(candidates) == 0:
+            candidates = np.arange(len(known))
+        centre = points[candidates].mean(axis=0)
+        nearest[code] = candidates[spatial.cKDTree(points[candidates]).query(centre)[1]]
+    positions[missing] = nearest[codes]
+    return positions
+
+
+def locate_prefixes(prefixes, geo_index, cities, states):
+    # Centroid (lat, lng) per zip code prefix, see nearest_prefixes
+    positions = nearest_prefixes(prefixes, cities, states, geo_index)
+    return geo_index["lat"].to_numpy()[positions], geo_index["lng"].to_numpy()[positions]
+
+
+def file_stamp(path):
+    # (mtime in ns, size) of a file, None while it does not exist; cached readers of single files take
+    # it as an argument so a rewritten file is read again
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def dataset_version(data_dir=DATA_DIR):
+    # Fingerprint of a build: the path, mtime and size of every fact part file and of DATASET_FILES.
+    # Rewriting or adding any partition changes it, unlike the mtime of the fact directories, which
+    # only moves when an entry directly inside them is added or removed.
+    paths = [os.path.join(root, name) for table in ["orders", "items"]
+             for root, _, names in os.walk(os.path.join(data_dir, table)) for name in names]
+    paths += [os.path.join(data_dir, f"{name}.parquet") for name in DATASET_FILES]
+    digest = hashlib.sha1()
+    for path in sorted(paths):
+        digest.update(repr((os.path.relpath(path, data_dir), file_stamp(path))).encode())
+    return digest.hexdigest()[:16]
+
+
+def read_geo_index():
+    # Built by `python -m helper_funcs.etl build`, sorted by zip_code_prefix, with each prefix's city
+    # (see city_keys) and state
+    return _read_geo_index(GEO_INDEX_PATH, file_stamp(GEO_INDEX_PATH))
+
+
 @st.cache_data(show_spinner=False)
-def read_geolocations(drop_duplicates=False):
-    df = pd.read_csv("assets/data/geolocation_dataset.csv",
-                     dtype={"geolocation_zip_code_prefix": "string"})
-    # df["geolocation_zip_code_prefix_3_digits"] = df["geolocation_zip_code_prefix"].str[0:3]
-    # df["geolocation_zip_code_prefix_3_digits"] = df["geolocation_zip_code_prefix_3_digits"].astype(
-    #     int)
-    if drop_duplicates:
-        df = df.drop_duplicates(subset="geolocation_city")
+def _read_geo_index(path, stamp):
+    return pd.read_parquet(path)
 
-    return df
+
+def read_prefix_distances():
+    return _read_prefix_distances(DISTANCES_PATH, file_stamp(DISTANCES_PATH))
 
 
 @st.cache_data(show_spinner=False)
-def read_data(add_geo_location=False):
-    df = pd.read_parquet("assets/data/orders_data.parquet")
-
-    df['order_purchase_timestamp'] = pd.to_datetime(
-        df['order_purchase_timestamp'], yearfirst=True)
-    df['order_approved_at'] = pd.to_datetime(
-        df['order_approved_at'], yearfirst=True, )
-    df['order_delivered_carrier_date'] = pd.to_datetime(
-        df['order_delivered_carrier_date'], yearfirst=True, )
-    df['order_delivered_customer_date'] = pd.to_datetime(
-        df['order_delivered_customer_date'], yearfirst=True, )
-    df['order_estimated_delivery_date'] = pd.to_datetime(
-        df['order_estimated_delivery_date'], yearfirst=True, )
-    df['shipping_limit_date'] = pd.to_datetime(
-        df['shipping_limit_date'], yearfirst=True, )
-
-    name_translation = pd.read_csv(
-        "assets/data/product_category_name_translation.csv")
-    df = df.merge(name_translation, how="inner", on="product_category_name")
-    df.drop(columns='product_category_name', inplace=True)
-    df.rename(
-        columns={"product_category_name_english": "product_category_name"}, inplace=True)
+def _read_prefix_distances(path, stamp):
+    if stamp is None:
+        return pd.DataFrame({"seller_zip_code_prefix": pd.Series(dtype="int32"),
+                             "customer_zip_code_prefix": pd.Series(dtype="int32"),
+                             "distance_covered": pd.Series(dtype="float32")})
+    return pd.read_parquet(path)
 
-    if add_geo_location:
-        df = df.merge(read_geolocations(drop_duplicates=True), how="inner",
-                    left_on="customer_city", right_on="geolocation_city")
-        df.rename(
-            columns={"geolocation_lat": "customer_lat", "geolocation_lng": "customer_lng"}, inplace=True)
 
-        df = df.merge(read_geolocations(drop_duplicates=True), how="inner",
-                                left_on="seller_city", right_on="geolocation_city")
-        df.rename(
-            columns={"geolocation_lat": "seller_lat", "geolocation_lng": "seller_lng"}, inplace=True)
+@st.cache_data(show_spinner=False)
+def read_ids(col):
+    return pd.read_parquet(os.path.join(IDS_PATH, f"{col}.parquet"))[col].to_numpy()
+
+
+def decode_ids(keys, col):
+    # Surrogate keys -> the Olist ids, for display and for files that outlive a build (e.g. churn scores)
+    return read_ids(col)[np.asarray(keys)]
+
+
+def partition_dir(root, year, month):
+    return os.path.join(root, f"purchase_year={year}", f"purchase_month={month:02d}")
+
+
+def date_range_filter(date_range):
+    # (date_col, start_date, end_date) with inclusive calendar days -> pyarrow filters. A purchase date
+    # range also selects the partitions (one conjunction per year), so other months are never opened;
+    # within the files, row groups whose statistics fall outside the range are skipped.
+    date_col, start_date, end_date = date_range
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1)
+    rows = [(date_col, ">=", start), (date_col, "<", end)]
+    if date_col != "order_purchase_timestamp":
+        return rows
+
+    last = end - pd.Timedelta(days=1)
+    return [
+        rows + [("purchase_year", "=", year),
+                ("purchase_month", ">=", start.month if year == start.year else 1),
+                ("purchase_month", "<=", last.month if year == last.year else 12)]
+        for year in range(start.year, last.year + 1)
+    ] or [rows]
+
+
+def partition_filter(date_range):
+    # Only the partition conjunctions of date_range_filter, for the items fact (its rows have no dates)
+    if date_range is None or date_range[0] != "order_purchase_timestamp":
+        return None
+    return [[f for f in conjunction if f[0] in PARTITION_COLS] for conjunction in date_range_filter(date_range)]
+
+
+def read_data(add_geo_location=False, columns=None, date_range=None):
+    # Timestamps, category translation and dtypes are applied by `python -m helper_funcs.etl build`.
+    # columns and date_range are pushed down to the parquet reader: only the tables holding those
+    # columns, and only rows inside the range (None reads everything). Cached per build, see
+    # dataset_version.
+    return _read_data(dataset_version(), add_geo_location, columns, date_range)
+
 
-        df['distance_covered'] = df.apply(lambda row: haversine(
-            (row['seller_lat'], row['seller_lng']), (row['customer_lat'], row['customer_lng']), unit="mi"), axis=1)
+@st.cache_data(show_spinner=False, max_entries=16)
+def _read_data(version, add_geo_location, columns, date_range):
+    return read_dataset(DATA_DIR, add_geo_location, columns, date_range)
+
+
+def read_orders(columns=None, date_range=None):
+    # The order fact, one row per order; date_range is pushed down like read_data's
+    return _read_orders(dataset_version(), columns, date_range)
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _read_orders(version, columns, date_range):
+    filters = date_range_filter(date_range) if date_range is not None else None
+    return pd.read_parquet(ORDERS_PATH, columns=columns, filters=filters).drop(columns=PARTITION_COLS,
+                                                                               errors="ignore")
+
+
+def read_payment_types(path=PAYMENTS_PATH):
+    # Distinct (order, payment type) pairs from the payments table, sorted by order key
+    return _read_payment_types(path, file_stamp(path))
+
+
+@st.cache_data(show_spinner=False)
+def _read_payment_types(path, stamp):
+    return pd.read_parquet(path, columns=["order_id", "payment_type"]).drop_duplicates(ignore_index=True)
+
+
+def payment_types(order_ids, pairs=None):
+    # Every payment type of each row's order, not only the first payment's that the rows carry:
+    # (row positions, payment types) with one entry per distinct type of the row's order
+    pairs = read_payment_types() if pairs is None else pairs
+    keys, order_ids = pairs["order_id"].to_numpy(), np.asarray(order_ids)
+    lo, hi = np.searchsorted(keys, order_ids, side="left"), np.searchsorted(keys, order_ids, side="right")
+    counts = hi - lo
+    at = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(lo, counts)
+    return np.repeat(np.arange(len(order_ids)), counts), pairs["payment_type"].array.take(at)
+
+
+def payment_type_sets(order_ids, pairs=None):
+    # Each row's order's payment types as one label, sorted and joined by "|" ("" for an order without
+    # payments), so a row can be grouped once yet still match every type of its order
+    rows, types = payment_types(order_ids, pairs)
+    codes, uniques = pd.factorize(types)
+    masks = np.zeros(len(order_ids), dtype=np.int64)
+    np.bitwise_or.at(masks, rows[codes >= 0], np.left_shift(1, codes[codes >= 0]))
+    sets, inverse = np.unique(masks, return_inverse=True)
+    labels = ["|".join(sorted(str(value) for bit, value in enumerate(uniques) if mask >> bit & 1)) for mask in sets]
+    return pd.Categorical.from_codes(inverse, categories=labels)
+
+
+def read_customer_level(columns=None):
+    return _read_customer_level(CUSTOMER_LEVEL_PATH, file_stamp(CUSTOMER_LEVEL_PATH), columns)
+
+
+@st.cache_data(show_spinner=False)
+def _read_customer_level(path, stamp, columns):
+    return pd.read_parquet(path, columns=columns)
+
+
+def lookup(table, key_col, keys):
+    # Rows of a table for the surrogate keys present in it (keys it lacks are dropped): a binary search
+    # on its sorted key column
+    positions, found = key_positions(table[key_col].to_numpy(), np.asarray(keys))
+    return table.take(positions[found])
+
+
+def key_positions(keys, row_keys):
+    # Position of each row key in a table's sorted, unique key column, and whether it is there
+    if len(keys) > 0 and keys[-1] - keys[0] + 1 == len(keys):
+        # A contiguous key range (all of a dimension, or the orders of a purchase date range): the
+        # position is the key's offset
+        at = row_keys.astype(np.int64) - keys[0]
+        found = (at >= 0) & (at < len(keys))
+        return np.where(found, at, 0), found
+    at = np.minimum(np.searchsorted(keys, row_keys), max(len(keys) - 1, 0))
+    return at, keys[at] == row_keys if len(keys) > 0 else np.zeros(len(row_keys), dtype=bool)
+
+
+def read_star(data_dir=DATA_DIR, columns=None, date_range=None):
+    # The item rows with the columns of the other tables joined on by key (inner joins, in item order).
+    # Only tables holding a requested column (or the date range's column) are read, so e.g. price by
+    # category never opens the orders or customers.
+    columns = ROW_COLS if columns is None else list(columns)
+    wanted = set(columns) | ({date_range[0]} if date_range is not None else set())
+
+    def needed(table):
+        return [col for col in STAR_COLS[table][1:] if col in wanted]
+
+    dimensions = {table: needed(table) for table in ["customers", "sellers", "products"]}
+    order_cols = needed("orders") + (["customer_id"] if dimensions["customers"] else [])
+    item_cols = [col for col in STAR_COLS["items"]
+                 if col in wanted or (col == "order_id" and order_cols)
+                 or (col == "seller_id" and dimensions["sellers"])
+                 or (col == "product_id" and dimensions["products"])]
+
+    items = pd.read_parquet(os.path.join(data_dir, "items"), columns=item_cols, filters=partition_filter(date_range))
+    # Each table joined so far, with the position of every surviving item row's match in it
+    joined = [(items, np.arange(len(items)))]
+
+    def join(table, key, frame, at):
+        positions, found = key_positions(table[key].to_numpy(), frame[key].to_numpy()[at])
+        joined[:] = [(rows, rows_at[found]) for rows, rows_at in joined] + [(table.drop(columns=key), positions[found])]
+
+    if order_cols:
+        orders = pd.read_parquet(os.path.join(data_dir, "orders"), columns=["order_id", *dict.fromkeys(order_cols)],
+                                 filters=date_range_filter(date_range) if date_range is not None else None)
+        join(orders, "order_id", *joined[0])
+    for table, cols in dimensions.items():
+        if cols:
+            key = STAR_COLS[table][0]
+            # Customers are reached through the orders' customer_id
+            frame, at = joined[1 if table == "customers" else 0]
+            row_keys = frame[key].to_numpy()[at]
+            # Only the row groups of the keys' range: a date range's customers have neighbouring keys
+            key_range = [(key, ">=", row_keys.min()), (key, "<=", row_keys.max())] if len(row_keys) > 0 else None
+            join(pd.read_parquet(os.path.join(data_dir, f"{table}.parquet"), columns=[key, *cols], filters=key_range),
+                 key, frame, at)
+
+    # The matched rows' columns, taken straight into one 2D block per dtype (categoricals are 1D), so
+    # the frame comes out consolidated without a second copy
+    sources = {col: (rows[col], at) for rows, at in joined for col in rows.columns if col in wanted}
+    by_dtype = {}
+    for col in columns:
+        by_dtype.setdefault(sources[col][0].dtype, []).append(col)
+    frames = []
+    for dtype, cols in by_dtype.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            frames.append(pd.DataFrame({col: sources[col][0].array.take(sources[col][1]) for col in cols}))
+            continue
+        block = np.empty((len(cols), len(joined[0][1])), dtype=dtype)
+        for row, col in zip(block, cols):
+            np.take(sources[col][0].to_numpy(), sources[col][1], out=row)
+        frames.append(pd.DataFrame(block.T, columns=cols, copy=False))
+    return pd.concat(frames, axis=1)[columns]
+
+
+def read_dataset(data_dir=DATA_DIR, add_geo_location=False, columns=None, date_range=None):
+    if columns is not None and add_geo_location:
+        columns = list(dict.fromkeys([*columns, *GEO_COLS]))
+    df = read_star(data_dir, columns, date_range)
+
+    if add_geo_location:
+        geo_index = read_geo_index()
+        for side in ["customer", "seller"]:
+            df[f"{side}_lat"], df[f"{side}_lng"] = locate_prefixes(
+                df[f"{side}_zip_code_prefix"], geo_index, df[f"{side}_city"], df[f"{side}_state"])
+
+        # Distances are precomputed per zip prefix pair by the ETL; only pairs missing from the table are computed here
+        df = df.merge(read_prefix_distances(), how="left",
+                      on=["seller_zip_code_prefix", "customer_zip_code_prefix"])
+        missing = df['distance_covered'].isna()
+        if missing.any():
+            df.loc[missing, 'distance_covered'] = distance_miles(
+                df.loc[missing, ['seller_lat', 'seller_lng']],
+                df.loc[missing, ['customer_lat', 'customer_lng']]).astype("float32")
 
     return df
 
 
+def data_version(df, *tags):
+    # Cheap fingerprint of a read_data frame for result caches: the build (dataset_version), the row
+    # count and the columns (pages read different column sets), plus any tags describing page-level
+    # changes made to the frame after read_data (e.g. added freight)
+    return (dataset_version(), len(df), tuple(df.columns)) + tags
+
+
 @st.cache_data(show_spinner=False)
 def months():
     with open("assets/data/dates.json") as f:
@@ -0,0 +1,316 @@
+import argparse
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from .data_parser import (DATA_DIR, GEO_COLS, ID_COLS, STAR_COLS, city_keys, distance_miles, locate_prefixes,
+                          partition_dir, read_payment_types, read_star)
+from .cube import build_cube
+
+
+RAW_DIR = "raw_data"
+
+DATE_COLS = [
+    "order_purchase_timestamp",
+    "order_approved_at",
+    "order_delivered_carrier_date",
+    "order_delivered_customer_date",
+    "order_estimated_delivery_date",
+    "shipping_limit_date",
+]
+
+# Each month of the fact tables is written in purchase order with row groups of this many rows, so
+# date-range reads (data_parser.read_data(date_range=...)) also skip row groups inside a month
+ROW_GROUP_ROWS = 50_000
+
+# Bounding box of Brazil; geolocation rows outside it are bad coordinates
+LAT_RANGE = (-34.0, 5.5)
+LNG_RANGE = (-74.0, -34.0)
+
+CATEGORY_COLS = [
+    "order_status",
+    "payment_type",
+    "product_category_name",
+    "seller_city",
+    "seller_state",
+    "customer_city",
+    "customer_state",
+]
+
+# Narrow ints for the counters. The money columns stay float64: they are summed over millions of rows,
+# where float32 sums drift by whole currency units.
+COMPACT_DTYPES = {
+    "order_item_id": "int16",
+    "payment_sequential": "int16",
+    "payment_installments": "int16",
+    "price": "float64",
+    "freight_value": "float64",
+    "payment_value": "float64",
+}
+
+
+def read_raw(raw_dir=RAW_DIR):
+    # Same joins as cleanup.ipynb: items -> products -> sellers, then orders -> payments -> customers
+    order_items = pd.read_csv(os.path.join(raw_dir, "olist_order_items_dataset.csv"))
+    products = pd.read_csv(os.path.join(raw_dir, "olist_products_dataset.csv"))
+    sellers = pd.read_csv(os.path.join(raw_dir, "olist_sellers_dataset.csv"))
+
+    products = products.loc[:, ["product_id", "product_category_name"]]
+    order_items = order_items.merge(products, how="inner", on="product_id")
+    order_items = order_items.merge(sellers, how="inner", on="seller_id")
+
+    orders_data = pd.read_csv(os.path.join(raw_dir, "olist_orders_dataset.csv"))
+    payments = pd.read_csv(os.path.join(raw_dir, "olist_order_payments_dataset.csv"))
+    customers = pd.read_csv(os.path.join(raw_dir, "olist_customers_dataset.csv"),
+                            dtype={"customer_zip_code_prefix": str})
+
+    orders_data = orders_data.merge(order_items, how="inner", on="order_id")
+    orders_data = orders_data.merge(payments, how="inner", on="order_id")
+    orders_data = orders_data.merge(customers, how="inner", on="customer_id")
+
+    return orders_data
+
+
+def transform(df, data_dir=DATA_DIR):
+    for col in DATE_COLS:
+        df[col] = pd.to_datetime(df[col], yearfirst=True)
+
+    name_translation = pd.read_csv(
+        os.path.join(data_dir, "product_category_name_translation.csv"))
+    df = df.merge(name_translation, how="inner", on="product_category_name")
+    df = df.drop(columns="product_category_name")
+    df = df.rename(
+        columns={"product_category_name_english": "product_category_name"})
+
+    df = df.astype({col: "category" for col in CATEGORY_COLS})
+    df = df.astype({"customer_zip_code_prefix": "int32", "seller_zip_code_prefix": "int32"})
+    df = df.astype(COMPACT_DTYPES)
+    return df
+
+
+def encode_ids(df, ids_dir):
+    # Replaces the hex id columns by int32 keys and writes each column's dictionary (the id of key k is
+    # row k). The dictionary is sorted by each id's first purchase, then by the id itself, so the keys
+    # depend only on the data, not on the row order of the raw files, and order keys run in purchase
+    # order (a date range's orders are a key range).
+    os.makedirs(ids_dir, exist_ok=True)
+    purchases = df["order_purchase_timestamp"].to_numpy()
+    for col in ID_COLS:
+        codes, ids = pd.factorize(df[col])
+        first_purchase = pd.Series(purchases).groupby(codes).min().to_numpy()
+        dictionary = pd.DataFrame({"first_purchase": first_purchase, col: ids}).sort_values(["first_purchase", col])
+        keys = np.empty(len(ids), dtype="int32")
+        keys[dictionary.index.to_numpy()] = np.arange(len(ids))
+        df[col] = keys[codes]
+        dictionary[[col]].to_parquet(os.path.join(ids_dir, f"{col}.parquet"), index=False)
+    return df
+
+
+def memory_report(df, ids_dir):
+    # Bytes per column of the stored schema against the same frame with hex id strings and 64-bit
+    # numbers (what read_data returned before the compact schema)
+    wide = df.astype({col: "int64" if np.dtype(dtype).kind == "i" else "float64"
+                      for col, dtype in COMPACT_DTYPES.items() if col in df.columns})
+    for col in ID_COLS:
+        if col in df.columns:
+            ids = pd.read_parquet(os.path.join(ids_dir, f"{col}.parquet"))[col]
+            wide[col] = ids.array.take(df[col].to_numpy())
+
+    report = pd.DataFrame({"before": wide.memory_usage(deep=True, index=False),
+                           "after": df.memory_usage(deep=True, index=False)})
+    report.loc["total"] = report.sum()
+    report["ratio"] = (report["before"] / report["after"]).round(1)
+    return report
+
+
+def build_geo_index(data_dir=DATA_DIR):
+    # One centroid per zip code prefix instead of the ~1M raw geolocation points, with the prefix's most
+    # common city and state, which data_parser.nearest_prefixes searches prefixes missing from the index by
+    geo = pd.read_csv(os.path.join(data_dir, "geolocation_dataset.csv"),
+                      usecols=["geolocation_zip_code_prefix", "geolocation_lat", "geolocation_lng",
+                               "geolocation_city", "geolocation_state"])
+    geo = geo[geo["geolocation_lat"].between(*LAT_RANGE) & geo["geolocation_lng"].between(*LNG_RANGE)]
+    geo["geolocation_city"] = city_keys(geo["geolocation_city"])
+
+    places = (
+        geo.groupby(["geolocation_zip_code_prefix", "geolocation_city", "geolocation_state"])
+        .size()
+        .reset_index(name="points")
+        .sort_values(["geolocation_zip_code_prefix", "points"], ascending=[True, False], kind="stable")
+        .drop_duplicates("geolocation_zip_code_prefix")
+        .set_index("geolocation_zip_code_prefix")
+    )
+    index = (
+        geo.groupby("geolocation_zip_code_prefix")
+        .agg(lat=("geolocation_lat", "mean"), lng=("geolocation_lng", "mean"))
+        .join(places[["geolocation_city", "geolocation_state"]])
+        .reset_index()
+        .rename(columns={"geolocation_zip_code_prefix": "zip_code_prefix", "geolocation_city": "city",
+                         "geolocation_state": "state"})
+        .astype({"zip_code_prefix": "int32", "lat": "float32", "lng": "float32", "city": "category",
+                 "state": "category"})
+        .sort_values("zip_code_prefix")
+    )
+
+    path = os.path.join(data_dir, "geolocation_index.parquet")
+    index.to_parquet(path, index=False)
+    print(f"Wrote {len(index):,} zip prefix centroids to {path}")
+    return index
+
+
+def build_distances(df, geo_index, data_dir=DATA_DIR):
+    # Seller -> customer distances, computed once per zip prefix pair; an existing table is only extended
+    path = os.path.join(data_dir, "prefix_distances.parquet")
+    keys = ["seller_zip_code_prefix", "customer_zip_code_prefix"]
+    # A prefix's city and state only matter when it is missing from the geolocation index
+    pairs = df[GEO_COLS].drop_duplicates(keys)
+
+    if os.path.exists(path):
+        known = pd.read_parquet(path)
+        pairs = pairs.merge(known[keys], how="left", on=keys, indicator=True)
+        pairs = pairs.loc[pairs["_merge"] == "left_only", GEO_COLS]
+    else:
+        known = None
+
+    seller_lat, seller_lng = locate_prefixes(pairs["seller_zip_code_prefix"], geo_index,
+                                             pairs["seller_city"], pairs["seller_state"])
+    customer_lat, customer_lng = locate_prefixes(pairs["customer_zip_code_prefix"], geo_index,
+                                                 pairs["customer_city"], pairs["customer_state"])
+    pairs = pairs[keys].assign(distance_covered=distance_miles(
+        np.column_stack([seller_lat, seller_lng]), np.column_stack([customer_lat, customer_lng])).astype("float32"))
+
+    table = pairs if known is None else pd.concat([known, pairs], ignore_index=True)
+    table.to_parquet(path, index=False)
+    print(f"Added {len(pairs):,} zip prefix pairs to {path} ({len(table):,} total)")
+    return table
+
+
+def month_partitions(df):
+    # (year, month, rows) per purchase month, in purchase order
+    purchase = df["order_purchase_timestamp"]
+    for (year, month), rows in df.groupby([purchase.dt.year, purchase.dt.month], sort=True):
+        yield year, month, rows
+
+
+def write_months(df, path, columns=None):
+    # Writes df's columns (all by default) as a month-partitioned dataset beside path and swaps it in,
+    # so readers never see a mix of old and new months
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    for year, month, rows in month_partitions(df):
+        part_dir = partition_dir(tmp_path, year, month)
+        os.makedirs(part_dir)
+        rows = rows if columns is None else rows[columns]
+        rows.to_parquet(os.path.join(part_dir, "part-0.parquet"), index=False, row_group_size=ROW_GROUP_ROWS)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def item_level(df):
+    # One row per order item: an order's items repeat once per payment row, so keep the rows of
+    # its first payment (the payment columns then describe that payment)
+    first_payment = df["payment_sequential"] == df.groupby("order_id")["payment_sequential"].transform("min")
+    return df[first_payment].reset_index(drop=True)
+
+
+def star_tables(df):
+    # The joined rows split into the star schema, without the repeats the joins introduced. The facts
+    # keep every joined column (writers select STAR_COLS after partitioning by purchase month); the
+    # payments and dimensions are projected and sorted by key.
+    items = item_level(df)
+    tables = {"items": items, "orders": items.drop_duplicates("order_id")}
+    tables["payments"] = (df.drop_duplicates(["order_id", "payment_sequential"])[STAR_COLS["payments"]]
+                          .sort_values(["order_id", "payment_sequential"], ignore_index=True))
+    for table in ["customers", "sellers", "products"]:
+        key = STAR_COLS[table][0]
+        tables[table] = items[STAR_COLS[table]].drop_duplicates(key).sort_values(key, ignore_index=True)
+    return tables
+
+
+def write_star(df, data_dir=DATA_DIR):
+    # Writes the star schema tables of the joined rows and returns the item rows, which are what
+    # data_parser.read_data joins back together
+    tables = star_tables(df)
+    for table in ["orders", "items"]:
+        write_months(tables[table], os.path.join(data_dir, table), STAR_COLS[table])
+    for table in ["payments", "customers", "sellers", "products"]:
+        tables[table].to_parquet(os.path.join(data_dir, f"{table}.parquet"), index=False,
+                                 row_group_size=ROW_GROUP_ROWS)
+    print(f"Wrote {len(df):,} joined rows as " + ", ".join(f"{len(rows):,} {table}" for table, rows in tables.items())
+          + f" to {data_dir}")
+    return tables["items"]
+
+
+def customer_level(items):
+    # One row per customer, sorted by customer key: first and last purchase, last order, lifetime
+    # orders and item revenue, home city and state, and the category of the first item bought.
+    # Items are in purchase order, and order keys follow it.
+    by_customer = items.groupby("customer_unique_id", sort=True, observed=True)
+    customers = by_customer.agg(
+        first_purchase=("order_purchase_timestamp", "min"), last_purchase=("order_purchase_timestamp", "max"),
+        last_order_id=("order_id", "max"), num_orders=("order_id", "nunique"), price=("price", "sum"),
+        customer_city=("customer_city", "first"), customer_state=("customer_state", "first"),
+        product_category_name=("product_category_name", "first"))
+    return customers.astype({"num_orders": "int32"}).reset_index()
+
+
+def write_customer_level(items, data_dir=DATA_DIR):
+    customers = customer_level(items)
+    path = os.path.join(data_dir, "customer_level.parquet")
+    customers.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS)
+    print(f"Wrote {len(customers):,} customers to {path}")
+
+
+def build(raw_dir=RAW_DIR, data_dir=DATA_DIR):
+    df = transform(read_raw(raw_dir), data_dir)
+    ids_dir = os.path.join(data_dir, "ids")
+    df = encode_ids(df, ids_dir)
+    # Purchase order, as order keys follow it
+    df = df.sort_values(["order_id", "order_item_id", "payment_sequential"], ignore_index=True)
+    items = write_star(df, data_dir)
+    report = memory_report(items, ids_dir)
+    print(f"Item rows take {report.at['total', 'before'] / 1024**2:,.0f} MiB in memory with hex ids and 64-bit "
+          f"numbers, {report.at['total', 'after'] / 1024**2:,.0f} MiB as stored")
+    write_customer_level(items, data_dir)
+
+    cube = build_cube(items, read_payment_types(os.path.join(data_dir, "payments.parquet")))
+    cube_path = os.path.join(data_dir, "orders_cube.parquet")
+    cube.to_parquet(cube_path, index=False)
+    print(f"Wrote {len(cube):,} cube cells to {cube_path}")
+
+    build_distances(items, build_geo_index(data_dir), data_dir)
+    return items
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m helper_funcs.etl",
+        description="Build the analysis-ready parquet store from the raw Olist CSVs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser(
+        "build", help="Parse, translate and type the raw CSVs into the star schema tables")
+    build_parser.add_argument("--raw-dir", default=RAW_DIR)
+    build_parser.add_argument("--data-dir", default=DATA_DIR)
+
+    distances_parser = subparsers.add_parser(
+        "distances", help="Add distances for zip prefix pairs missing from prefix_distances.parquet")
+    distances_parser.add_argument("--data-dir", default=DATA_DIR)
+
+    report_parser = subparsers.add_parser(
+        "report", help="Bytes per column of the item rows before and after the compact schema")
+    report_parser.add_argument("--data-dir", default=DATA_DIR)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build(args.raw_dir, args.data_dir)
+    elif args.command == "distances":
+        build_distances(read_star(args.data_dir, columns=GEO_COLS),
+                        pd.read_parquet(os.path.join(args.data_dir, "geolocation_index.parquet")),
+                        args.data_dir)
+    elif args.command == "report":
+        print(memory_report(read_star(args.data_dir), os.path.join(args.data_dir, "ids")).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+
+FILTER_COLS = [
+    "order_status", "payment_type", "product_category_name",
+    "seller_city", "seller_state", "customer_city", "customer_state"]
+
+DATE_COLS = [
+    "order_purchase_timestamp", "order_delivered_carrier_date",
+    "order_delivered_customer_date", "order_estimated_delivery_date"]
+
+
+class FilterIndex:
+    # Row positions of a frame grouped by value (one sorted code array per filter column) plus a
+    # sorted timestamp index per date column, so a filter state becomes a single boolean mask.
+    # Only valid for the exact frame it was built from. multi_values gives a column's values as
+    # (row positions, values) pairs instead, for rows holding several values (an order's payment
+    # types); selecting any of them selects the row.
+
+    def __init__(self, df, columns=FILTER_COLS, date_cols=DATE_COLS, multi_values=None):
+        self.n_rows = len(df)
+        multi_values = multi_values or {}
+
+        self.postings = {}
+        for col in columns:
+            rows, values = multi_values.get(col, (np.arange(self.n_rows), df[col]))
+            codes, uniques = pd.factorize(values)
+            sort = np.argsort(codes, kind="stable")
+            # Rows holding value i are order[bounds[i]:bounds[i + 1]]; missing values (code -1) sort first
+            order = rows[sort]
+            bounds = np.searchsorted(codes[sort], np.arange(len(uniques) + 1))
+            self.postings[col] = (pd.Index(uniques), order, bounds)
+
+        self.dates = {}
+        for col in date_cols:
+            values = df[col].to_numpy()
+            valid = np.flatnonzero(~np.isnat(values))
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self.dates[col] = (values[order], order)
+
+    @property
+    def nbytes(self):
+        # Memory held by the postings (uniques, row order, bounds) and the sorted date arrays
+        postings = sum(uniques.memory_usage(deep=True) + order.nbytes + bounds.nbytes
+                       for uniques, order, bounds in self.postings.values())
+        dates = sum(values.nbytes + order.nbytes for values, order in self.dates.values())
+        return postings + dates
+
+    def value_mask(self, col, selected):
+        uniques, order, bounds = self.postings[col]
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for i in uniques.get_indexer(list(selected)):
+            if i >= 0:
+                mask[order[bounds[i]:bounds[i + 1]]] = True
+        return mask
+
+    def date_mask(self, date_col, start_date, end_date):
+        # Inclusive calendar-day bounds, same as comparing `.dt.date`
+        values, order = self.dates[date_col]
+        start = np.datetime64(start_date, "D").astype(values.dtype)
+        end = (np.datetime64(end_date, "D") + np.timedelta64(1, "D")).astype(values.dtype)
+        lo, hi = np.searchsorted(values, [start, end], side="left")
+
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[order[lo:hi]] = True
+        return mask
+
+    def mask(self, date_col, start_date, end_date, selections):
+        mask = self.date_mask(date_col, start_date, end_date)
+        for col, selected in selections.items():
+            if len(selected) > 0:
+                mask &= self.value_mask(col, selected)
+        return mask
@@ -1,68 +1,261 @@
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.preprocessing import OrdinalEncoder
-from sklearn.pipeline import make_pipeline
-from sklearn.compose import make_column_transformer
-from sklearn.model_selection import train_test_split
-from sklearn.linear_model import LogisticRegression
-from sklearn.neighbors import KNeighborsClassifier
 from scipy.cluster import hierarchy
-from sklearn import metrics
-from pycaret.classification import *
 import streamlit as st
+import glob
+import importlib
+import json
+import os
+from . import data_parser
+from .model_registry import registry
 import pandas as pd
-import plotly_express as px
-
-coltransform = make_column_transformer(
-    (
-        OrdinalEncoder(),
-        [
-            "order_status",
-            "seller_state",
-            "payment_type",
-            "customer_state",
-            "product_category_name",
-        ],
-    ),
-    remainder="passthrough",
-)
+import numpy as np
 
+# sklearn and pycaret are imported inside the functions that need them: importing them here cost
+# every page seconds on first load, even pages that only cluster (see benchmarks/bench_imports.py)
 
+MODELS_DIR = "models/churn"
+
+CATEGORICAL_FEATURES = [
+    "customer_city",
+    "seller_city",
+    "order_status",
+    "seller_state",
+    "payment_type",
+    "customer_state",
+    "product_category_name",
+]
+
+# Churn model inputs, in the order the bundled best_model.pkl pipeline was fit on
+MODEL_FEATURES = [
+    "order_status",
+    "price",
+    "freight_value",
+    "seller_zip_code_prefix",
+    "seller_city",
+    "seller_state",
+    "payment_sequential",
+    "payment_type",
+    "payment_installments",
+    "payment_value",
+    "customer_zip_code_prefix",
+    "customer_city",
+    "customer_state",
+    "product_category_name",
+    "geolocation_zip_code_prefix_x",
+    "customer_lat",
+    "customer_lng",
+    "geolocation_zip_code_prefix_y",
+    "seller_lat",
+    "seller_lng",
+    "distance_covered",
+]
+
+# Columns ordinal-encoded by the standalone models
+ORDINAL_FEATURES = [
+    "order_status",
+    "seller_state",
+    "payment_type",
+    "customer_state",
+    "product_category_name",
+]
+
+# (module, class) per standalone model, imported on first use
 defaultmodels = {
-    "Logistic Regression": LogisticRegression,
-    "KNearest Neighbours": KNeighborsClassifier,
+    "Logistic Regression": ("sklearn.linear_model", "LogisticRegression"),
+    "KNearest Neighbours": ("sklearn.neighbors", "KNeighborsClassifier"),
 }
 
-st.cache_resource()
+# Pycaret-free export (helper_funcs.scorer.Scorer) of each training run's model.pkl, served once
+# metrics.json records that it predicts exactly like model.pkl on the holdout rows
+SCORER_FILE = "scorer.pkl"
+
+# Pycaret-free export of the bundled best_model.pkl, served until a model is trained; rebuild it with
+# `python -m helper_funcs.training --export best_model.pkl best_scorer.pkl`
+BUNDLED_SCORER = "best_scorer.pkl"
+
+def latest_artifacts(models_dir: str = MODELS_DIR):
+    # Directory of the most recent `python -m helper_funcs.training` run, if any
+    latest_file = os.path.join(models_dir, "LATEST")
+    if not os.path.exists(latest_file):
+        return None
+    with open(latest_file) as f:
+        return os.path.join(models_dir, f.read().strip())
+
+
+def read_training_info(latest: str) -> dict:
+    with open(os.path.join(latest, "metrics.json")) as f:
+        return json.load(f)
+
+
+def model_path(models_dir: str = MODELS_DIR):
+    # Latest trained model (its scorer when that was checked against it), falling back to the bundled
+    # scorer
+    latest = latest_artifacts(models_dir)
+    if latest is None:
+        return BUNDLED_SCORER
+    if read_training_info(latest).get("scorer_matches_model"):
+        return os.path.join(latest, SCORER_FILE)
+    return os.path.join(latest, "model.pkl")
 
 
 def get_model():
-    model = load_model("best_model")
-    return model
+    # Loaded once per process and artifact hash; a newly trained or replaced artifact is picked up
+    # on the next call
+    return registry.get("churn_model", model_path())
+
+
+def model_frame(customer_df: pd.DataFrame) -> pd.DataFrame:
+    # Churn model features (plus Churn when labelled). geolocation_zip_code_prefix_x/_y are the
+    # customer's and seller's geolocation prefixes, i.e. the geo index prefix their coordinates come
+    # from (see data_parser.nearest_prefixes)
+    geo_index = data_parser.read_geo_index()
+    prefixes = geo_index["zip_code_prefix"].to_numpy()
+    located = {
+        f"geolocation_zip_code_prefix_{suffix}": prefixes[data_parser.nearest_prefixes(
+            customer_df[f"{side}_zip_code_prefix"], customer_df[f"{side}_city"],
+            customer_df[f"{side}_state"], geo_index)]
+        for suffix, side in [("x", "customer"), ("y", "seller")]
+    }
+    columns = MODEL_FEATURES + (["Churn"] if "Churn" in customer_df.columns else [])
+    df_model = customer_df.assign(**located)[columns]
+    return df_model.astype({"customer_city": "category", "seller_city": "category"})
+
+
+# Ward is exact unless a caller opts in to scalable mode by passing max_points: then inputs with more
+# points run on at most CLUSTER_GRID_POINTS grid-binned representative points instead. Exact ward
+# needs quadratic memory in the number of points (~0.9 GB of pairwise distances at the ~15k distinct
+# customer locations the pages cluster), so the pages opt in at this size, above which it stops
+# fitting comfortably.
+CLUSTER_POINT_BUDGET = 20_000
+
+# Representatives of scalable mode; weighted_ward takes quadratic time in their number
+CLUSTER_GRID_POINTS = 2_000
+
+
+def grid_points(X: np.ndarray, max_points: int):
+    # Bin points on an equal-width grid over each column's range, using the finest grid with at
+    # most max_points occupied cells. Returns the cell means, their point counts and each point's cell.
+    lo, span = X.min(axis=0), np.ptp(X, axis=0)
+    span[span == 0] = 1
+
+    def assign(bins):
+        cells = np.minimum(((X - lo) / span * bins).astype(np.int64), bins - 1)
+        codes = np.ravel_multi_index(cells.T, (bins,) * X.shape[1])
+        return np.unique(codes, return_inverse=True)[1]
+
+    low, high, best = 1, max_points, assign(1)
+    while low <= high:
+        bins = (low + high) // 2
+        assignment = assign(bins)
+        if assignment.max() + 1 <= max_points:
+            best, low = assignment, bins + 1
+        else:
+            high = bins - 1
+
+    counts = np.bincount(best)
+    means = np.column_stack([np.bincount(best, weights=X[:, j]) / counts for j in range(X.shape[1])])
+    return means, counts, best
+
+
+def weighted_ward(points: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Ward linkage of points that each stand for `weights` original points, as a scipy linkage
+    # matrix. Merge heights are those of ward on the original points when each group is collapsed
+    # to its mean, so with unit weights this matches hierarchy.ward. Nearest-neighbour chain: linear
+    # memory and quadratic time in the number of representatives.
+    n = len(points)
+    centroids, sizes = points.astype(float), weights.astype(float)
+    active = np.ones(n, dtype=bool)
+    merges, chain = [], []
+
+    while len(merges) < n - 1:
+        if not chain:
+            chain.append(int(np.argmax(active)))
+        i = chain[-1]
+        # Squared merge heights: 2 * n_i * n_j / (n_i + n_j) * |c_i - c_j|^2
+        diff = centroids - centroids[i]
+        d = 2 * sizes[i] * sizes / (sizes[i] + sizes) * np.einsum("ij,ij->i", diff, diff)
+        d[~active] = np.inf
+        d[i] = np.inf
+        j = int(np.argmin(d))
+        # Prefer the previous chain element on ties so reciprocal neighbours are always found
+        if len(chain) > 1 and d[chain[-2]] <= d[j]:
+            j = chain[-2]
+        if len(chain) > 1 and j == chain[-2]:
+            del chain[-2:]
+            total = sizes[i] + sizes[j]
+            centroids[j] = (sizes[i] * centroids[i] + sizes[j] * centroids[j]) / total
+            sizes[j], active[i] = total, False
+            merges.append((i, j, np.sqrt(d[j])))
+        else:
+            chain.append(j)
+
+    # Order merges by height and relabel slots to scipy's cluster ids (n + row for merged clusters).
+    # The count column holds representatives, not original points, as scipy validates it against n.
+    linkage = np.empty((n - 1, 4))
+    label, size = np.arange(n), np.ones(2 * n - 1)
+    for row, k in enumerate(sorted(range(len(merges)), key=lambda k: merges[k][2])):
+        i, j, height = merges[k]
+        a, b = sorted((label[i], label[j]))
+        size[n + row] = size[a] + size[b]
+        linkage[row] = a, b, height, size[n + row]
+        label[i] = label[j] = n + row
+    return linkage
+
+
+def linkage_tree(X: np.ndarray, max_points: int = None, representatives: int = CLUSTER_GRID_POINTS):
+    # Ward linkage over the points (or their count-weighted grid cell means in scalable mode) plus
+    # each point's leaf in the tree; computed once, then cut for any number of clusters
+    if max_points is None or len(X) <= max_points:
+        return hierarchy.ward(X), np.arange(len(X))
+
+    means, counts, assignment = grid_points(X, min(representatives, max_points))
+    return weighted_ward(means, counts), assignment
+
+
+def cut_labels(tree, n_clusters: int) -> np.ndarray:
+    linkage, assignment = tree
+    return hierarchy.cut_tree(linkage, n_clusters=n_clusters).ravel()[assignment]
+
+
+def cluster_labels(X: np.ndarray, n_clusters: int, max_points: int = None) -> np.ndarray:
+    return cut_labels(linkage_tree(X, max_points), n_clusters)
 
 
 @st.cache_data(show_spinner=False)
+def cluster_tree(_df: pd.DataFrame, key: tuple, columns: list, max_points: int = None):
+    # Cached on key, the caller's data version and filter state (st_filters.filter_key), and the
+    # columns; the frame itself is never hashed
+    return linkage_tree(_df[columns].to_numpy(dtype=float), max_points)
+
+
 def cluster(
     n_clusters: int,
     df: pd.DataFrame,
+    key: tuple,
     columns: list = ["customer_lat", "customer_lng", "distance_covered"],
+    *,
+    max_points: int = None,
 ) -> pd.DataFrame:
+    # The tree is cached per key and columns, so changing n_clusters only re-cuts it
     with st.spinner():
-        clustering_model_no_clusters = AgglomerativeClustering(
-            n_clusters=n_clusters, linkage="ward"
-        )
-        clustering_model_no_clusters.fit(df[columns])
-        labels_no_clusters = clustering_model_no_clusters.labels_
-        df["cluster"] = labels_no_clusters
+        df["cluster"] = cut_labels(cluster_tree(df, key, columns, max_points), n_clusters)
         return df
 
 
 @st.cache_resource()
 def train(X: pd.DataFrame, y: pd.DataFrame, selected_key):
+    from sklearn import metrics
+    from sklearn.compose import make_column_transformer
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import OrdinalEncoder
+
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.30, random_state=50
     )
 
-    model = defaultmodels[selected_key]()
+    module, name = defaultmodels[selected_key]
+    model = getattr(importlib.import_module(module), name)()
+    coltransform = make_column_transformer((OrdinalEncoder(), ORDINAL_FEATURES), remainder="passthrough")
     pipeline = make_pipeline(coltransform, model)
     pipeline.fit(X_train, y_train)
     pred = pipeline.predict(X_test)
@@ -81,64 +274,22 @@ def prediction(_model, df):
     return _model.predict_proba(df)[:, 1]
 
 
-@st.cache_resource()
-def pycaret_modelling(df):
-    model = get_model()
-    st.write(model)
-
-    s = setup(
-        data=df,
-        target="Churn",
-        categorical_features=[
-            "customer_city",
-            "seller_city",
-            "order_status",
-            "seller_state",
-            "payment_type",
-            "customer_state",
-            "product_category_name",
-        ],
-        session_id=123,
-        verbose=False,
-    )
-    # feature_names = df.drop("Churn", axis=1).columns
-    # importances = model.feature_importances_
-    #     # Create a dataframe from feature importances
-    # df_importances = pd.DataFrame({'Feature': feature_names, 'Importance': importances})
+def show_training_artifacts(models_dir: str = MODELS_DIR):
+    # Metrics and plots written by `python -m helper_funcs.training`
+    latest = latest_artifacts(models_dir)
+    if latest is None:
+        st.info("No trained churn model yet. Run `python -m helper_funcs.training` to train one.")
+        return
 
-    # # Sort the dataframe by importance in descending order
-    # df_importances = df_importances.sort_values(by='Importance', ascending=False)
+    info = read_training_info(latest)
 
-    with st.expander("Show Model Plots"):
-        # Plot feature importances using Plotly Express
-        # fig = px.bar(df_importances, x='Feature', y='Importance', title='Feature Importances')
-        # st.plotly_chart(fig)
-        plot_model(
-            model,
-            "auc",
-            scale=1,
-            plot_kwargs={"percent": True},
-            display_format="streamlit",
-        )
-        plot_model(
-            model,
-            "confusion_matrix",
-            scale=1,
-            plot_kwargs={"percent": True},
-            display_format="streamlit",
-        )
-        plot_model(
-            model,
-            "class_report",
-            scale=1,
-            plot_kwargs={"percent": True},
-            display_format="streamlit",
-        )
-
-    return model
+    st.write(
+        f"{info['estimator']} (version {info['version']}), trained on {info['rows']:,} rows "
+        f"with a {info['churn_days']} day churn period"
+    )
+    st.dataframe(pd.DataFrame(info["holdout_metrics"]))
 
+    with st.expander("Show Model Plots"):
+        for image in sorted(glob.glob(os.path.join(latest, "plots", "*.png"))):
+            st.image(image)
 
-@st.cache_data()
-def pycaret_prediction(df):
-    model = get_model()
-    return model.predict_proba(df)[:, 1]
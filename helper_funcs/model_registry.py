@@ -0,0 +1,86 @@
+import datetime as dt
+import hashlib
+import os
+import threading
+import time
+import tracemalloc
+import joblib
+
+
+def file_sha256(path, chunk_size=1024**2):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    # Process-wide cache of model artifacts. Each artifact is loaded once per content hash; when the
+    # file on disk changes (new mtime/size and a new hash) the next get() loads and swaps it in
+    # without a restart. Load time and allocated memory are recorded per loaded version.
+
+    def __init__(self, loader=joblib.load):
+        self.loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, path=None):
+        return self.entry(name, path)["model"]
+
+    def entry(self, name, path=None):
+        path = path or f"{name}.pkl"
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._entries.get(name)
+        if entry is not None and entry["path"] == path and entry["signature"] == signature:
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry["path"] == path and entry["signature"] == signature:
+                return entry
+
+            sha256 = file_sha256(path)
+            if entry is not None and entry["sha256"] == sha256:
+                # Touched but unchanged: keep the loaded model
+                entry = dict(entry, path=path, signature=signature)
+            else:
+                entry = self._load(name, path, signature, sha256)
+            self._entries[name] = entry
+            return entry
+
+    def _load(self, name, path, signature, sha256):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+
+        model = self.loader(path)
+
+        load_seconds = time.perf_counter() - start
+        memory_bytes = tracemalloc.get_traced_memory()[0] - before
+        if not tracing:
+            tracemalloc.stop()
+
+        return {
+            "name": name,
+            "model": model,
+            "path": path,
+            "signature": signature,
+            "sha256": sha256,
+            "version": sha256[:12],
+            "loaded_at": dt.datetime.now(),
+            "load_seconds": load_seconds,
+            "memory_bytes": memory_bytes,
+        }
+
+    def records(self):
+        # Metadata of the currently loaded models, without the model objects
+        return [{key: value for key, value in entry.items() if key != "model"}
+                for entry in self._entries.values()]
+
+
+registry = ModelRegistry()
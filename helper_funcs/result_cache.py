@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+
+def frame_bytes(value):
+    # Shallow size of a DataFrame/Series (string payloads are not walked); 0 for anything else
+    if hasattr(value, "memory_usage"):
+        usage = value.memory_usage(index=True)
+        return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+    return 0
+
+
+class ResultCache:
+    # Process-wide LRU cache bounded by entry count and an approximate memory budget.
+    # Keys must be hashable, e.g. (dataset version, filter tuple); the newest entry is always kept.
+
+    def __init__(self, max_entries=32, max_bytes=512 * 1024**2, sizeof=frame_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while len(self._entries) > 1 and (
+                    len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return self._bytes
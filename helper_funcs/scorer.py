@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+
+class Scorer:
+    # A fitted pipeline's preprocessing reduced to lookups in front of its fitted estimator, so scoring
+    # needs neither pycaret nor the encoder packages. Built by training.build_scorer, which reads every
+    # value below off the pipeline's own fitted steps.
+    #   fill_values: numeric input -> value its missing entries are imputed with
+    #   categories: categorical input -> known categories
+    #   tables: categorical input -> (output columns, one row per known category, then unseen, then
+    #           missing)
+
+    def __init__(self, estimator, fill_values, categories, tables):
+        self.estimator = estimator
+        self.fill_values = fill_values
+        self.categories = categories
+        self.tables = tables
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        features = {}
+        for column, (outputs, table) in self.tables.items():
+            values = X[column].astype(object)
+            known = len(self.categories[column])
+            codes = pd.Index(self.categories[column]).get_indexer(values)
+            codes = np.where(values.isna(), known + 1, np.where(codes < 0, known, codes))
+            features.update(zip(outputs, table[codes].T))
+
+        for column in self.estimator.feature_names_in_:
+            if column not in features:
+                features[column] = X[column].fillna(self.fill_values[column]) \
+                    if column in self.fill_values else X[column]
+        return pd.DataFrame({column: features[column] for column in self.estimator.feature_names_in_},
+                            index=X.index)
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        return self.estimator.predict_proba(self.transform(X))
+
+    def predict(self, X: pd.DataFrame) -> np.ndarray:
+        return self.estimator.predict(self.transform(X))
@@ -0,0 +1,80 @@
+import argparse
+import datetime as dt
+import os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from joblib import Parallel, delayed
+from . import data_parser, ml_models
+from .model_registry import file_sha256, registry
+
+
+SCORES_PATH = os.path.join(data_parser.DATA_DIR, "churn_scores.parquet")
+SCORE_COLS = ["customer_unique_id", "churn_probability", "model_version", "scored_at"]
+
+
+def latest_customer_rows(items):
+    # Each customer's most recent order item row, i.e. the state the page's predictions describe: the
+    # last item of the customer's last order (customer-level table). Items are in purchase order.
+    last_orders = data_parser.read_customer_level(columns=["last_order_id"])["last_order_id"].to_numpy()
+    rows = items[np.isin(items["order_id"].to_numpy(), last_orders)]
+    return rows.drop_duplicates("order_id", keep="last").reset_index(drop=True)
+
+
+def score_chunk(model_path, X):
+    # Runs in a worker process: the registry loads the pipeline once per worker, not once per chunk
+    return registry.get("churn_model", model_path).predict_proba(X)[:, 1]
+
+
+def score(rows, model_path, chunk_size=50_000, n_jobs=-1):
+    X = ml_models.model_frame(rows)
+    chunks = [X.iloc[start:start + chunk_size] for start in range(0, len(X), chunk_size)]
+    probabilities = Parallel(n_jobs=n_jobs)(delayed(score_chunk)(model_path, chunk) for chunk in chunks)
+
+    return pd.DataFrame({
+        # Olist ids rather than surrogate keys, which are only stable within one ETL build
+        "customer_unique_id": data_parser.decode_ids(rows["customer_unique_id"], "customer_unique_id"),
+        "churn_probability": np.concatenate(probabilities) if probabilities else np.empty(0),
+        "model_version": file_sha256(model_path)[:12],  # same id the registry reports
+        "scored_at": pd.Timestamp.now().floor("s"),
+    })
+
+
+def read_scores(path=SCORES_PATH):
+    # None until `python -m helper_funcs.scoring` has run; re-read whenever the job rewrites the file
+    if not os.path.exists(path):
+        return None
+    return _read_scores(path, os.path.getmtime(path))
+
+
+@st.cache_data(show_spinner=False)
+def _read_scores(path, mtime):
+    return pd.read_parquet(path, columns=SCORE_COLS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m helper_funcs.scoring",
+        description="Score every customer with the latest churn model and write the scores to parquet")
+    parser.add_argument("--out", default=SCORES_PATH)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Worker processes, -1 for all cores")
+    args = parser.parse_args(argv)
+
+    model_path = ml_models.model_path()
+    rows = latest_customer_rows(data_parser.read_data(add_geo_location=True))
+
+    start = dt.datetime.now()
+    scores = score(rows, model_path, args.chunk_size, args.n_jobs)
+    # Write beside the target and rename, so the dashboard never reads a half-written table
+    tmp_path = f"{args.out}.tmp"
+    scores.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, args.out)
+
+    seconds = (dt.datetime.now() - start).total_seconds()
+    print(f"Scored {len(scores):,} customers with model {scores['model_version'].iat[0] if len(scores) else '-'} "
+          f"in {seconds:.1f}s -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
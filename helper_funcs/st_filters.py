@@ -1,7 +1,24 @@
+import numpy as np
 import streamlit as st
+from .data_parser import data_version, payment_types, read_data, read_payment_types
+from .filter_index import FilterIndex, DATE_COLS, FILTER_COLS
+from .result_cache import ResultCache
 
 
-def filter_widgets(df):
+def build_filter_options(df):
+    # Everything the sidebar widgets need from the data: the date range of each date column and
+    # the values of each filter column. Small, so backends can compute it without the rows.
+    dates = {}
+    for col in DATE_COLS:
+        values = df[col].dropna()
+        dates[col] = (values.min().date(), values.max().date())
+    values = {col: df[col].dropna().unique() for col in FILTER_COLS}
+    # Rows carry their order's first payment type; the filter matches any of the order's payments
+    values["payment_type"] = read_payment_types()["payment_type"].dropna().unique()
+    return {"dates": dates, "values": values}
+
+
+def filter_widgets(options):
     date_cols = [
         "order_purchase_timestamp", "order_delivered_carrier_date",
         "order_delivered_customer_date", "order_estimated_delivery_date"]
@@ -9,8 +26,7 @@ def filter_widgets(df):
     st.sidebar.write("**Filter Date By:**")
     date_col = st.sidebar.selectbox(
         "date_col", key="date_col", options=date_cols, label_visibility="collapsed")
-    df = df[~(df[date_col].isna())]
-    min_date, max_date = df[date_col].dt.date.min(), df[date_col].dt.date.max()
+    min_date, max_date = options["dates"][date_col]
 
     start_col, end_col = st.sidebar.columns(2)
     with start_col:
@@ -26,17 +42,17 @@ def filter_widgets(df):
         st.error("Start Date Can Not be Greater than End Date")
         st.stop()
 
-    order_status = df['order_status'].unique()
+    order_status = options['values']['order_status']
     st.sidebar.write("**Order Status**")
     sel_order_status = st.sidebar.multiselect(
         "order_status", key="order_status", options=order_status, label_visibility="collapsed")
 
-    payment_types = df['payment_type'].unique()
+    payment_types = options['values']['payment_type']
     st.sidebar.write("**Payment Type**")
     sel_payment_type = st.sidebar.multiselect(
         label="payment_type", key="payment_type", options=payment_types, label_visibility="collapsed")
 
-    prod_category = df['product_category_name'].unique()
+    prod_category = options['values']['product_category_name']
     st.sidebar.write("**Product Categories**")
     sel_prod_category = st.sidebar.multiselect(
         label="product_category_name", key="product_category_name", options=prod_category, label_visibility="collapsed")
@@ -44,13 +60,13 @@ def filter_widgets(df):
     col_seller_city, col_seller_state = st.sidebar.columns(2)
 
     with col_seller_city:
-        seller_city = df['seller_city'].unique()
+        seller_city = options['values']['seller_city']
         st.write("**Seller City**")
         sel_seller_city = st.multiselect(
             "seller_city", key="seller_city", options=seller_city, label_visibility="collapsed")
 
     with col_seller_state:
-        seller_state = df['seller_state'].unique()
+        seller_state = options['values']['seller_state']
         st.write("**Seller State**")
         sel_seller_state = st.multiselect(
             "seller_state", key="seller_state", options=seller_state, label_visibility="collapsed")
@@ -58,13 +74,13 @@ def filter_widgets(df):
     col_cus_city, col_cus_state = st.sidebar.columns(2)
 
     with col_cus_city:
-        customer_city = df['customer_city'].unique()
+        customer_city = options['values']['customer_city']
         st.write("**Customer City**")
         sel_customer_city = st.multiselect(
             "customer_city", key="customer_city", options=customer_city, label_visibility="collapsed")
 
     with col_cus_state:
-        customer_state = df['customer_state'].unique()
+        customer_state = options['values']['customer_state']
         st.write("**Customer State**")
         sel_customer_state = st.multiselect(
             "customer_state", key="customer_state", options=customer_state, label_visibility="collapsed")
@@ -74,31 +90,59 @@ def filter_widgets(df):
     return filters
 
 
-@st.cache_data(show_spinner=False)
-def filter_data(df, date_col, start_date, end_date, sel_order_status, sel_payment_type, sel_prod_category, sel_seller_city, sel_seller_state, sel_customer_city, sel_customer_state):
-    date_filter = (df[date_col].dt.date >= start_date) & (
-        df[date_col].dt.date <= end_date)
-    df = df[date_filter]
+# Keyed on data_parser.data_version(...) so the frame itself is never hashed
+filter_indexes = ResultCache(max_entries=4, max_bytes=256 * 1024**2, sizeof=lambda index: index.nbytes)
+filter_results = ResultCache(max_entries=32, max_bytes=512 * 1024**2)
+filter_option_sets = ResultCache(max_entries=8, sizeof=lambda options: 0)
+
+
+def filter_options(df, version):
+    options = filter_option_sets.get(version)
+    if options is None:
+        options = filter_option_sets.put(version, build_filter_options(df))
+    return options
+
+
+def sidebar_options():
+    # Widget options from a cached read of only the date and filter columns
+    df = read_data(columns=DATE_COLS + FILTER_COLS)
+    return filter_options(df, data_version(df, "filter_options"))
+
+
+def date_range(filters):
+    # The (date_col, start_date, end_date) part of a filter state, for read_data pushdown
+    return tuple(filters[:3])
+
+
+def filter_index(df, version):
+    index = filter_indexes.get(version)
+    if index is None:
+        index = filter_indexes.put(version, FilterIndex(
+            df, multi_values={"payment_type": payment_types(df["order_id"])}))
+    return index
 
-    if len(sel_order_status) > 0:
-        df = df[df['order_status'].isin(sel_order_status)]
 
-    if len(sel_payment_type) > 0:
-        df = df[df['payment_type'].isin(sel_payment_type)]
+def split_filters(filters):
+    # filter_widgets() output -> (date_col, start_date, end_date, {column: selected values})
+    date_col, start_date, end_date = filters[:3]
+    return date_col, start_date, end_date, dict(zip(FILTER_COLS, filters[3:]))
 
-    if len(sel_prod_category) > 0:
-        df = df[df['product_category_name'].isin(sel_prod_category)]
 
-    if len(sel_seller_city) > 0:
-        df = df[df['seller_city'].isin(sel_seller_city)]
+def filter_key(version, filters):
+    date_col, start_date, end_date, selections = split_filters(filters)
+    return (version, date_col, start_date, end_date) + tuple(
+        tuple(sorted(map(str, selected))) for selected in selections.values())
 
-    if len(sel_seller_state) > 0:
-        df = df[df['seller_state'].isin(sel_seller_state)]
 
-    if len(sel_customer_city) > 0:
-        df = df[df['customer_city'].isin(sel_customer_city)]
+def filter_data(df, version, *filters):
+    key = filter_key(version, filters)
 
-    if len(sel_customer_state) > 0:
-        df = df[df['customer_state'].isin(sel_customer_state)]
+    filtered = filter_results.get(key)
+    if filtered is None:
+        # Combine every filter into one mask, then take the matching rows once
+        date_col, start_date, end_date, selections = split_filters(filters)
+        mask = filter_index(df, version).mask(date_col, start_date, end_date, selections)
+        filtered = filter_results.put(key, df.take(np.flatnonzero(mask)))
 
-    return df
+    # Pages add columns to the result, so hand out a shallow copy of the cached frame
+    return filtered.copy(deep=False)
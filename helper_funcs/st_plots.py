@@ -15,11 +15,10 @@ def get_key_metrics(top_df, city_, metric):
     return top_value, avg, med, min_value, max_value
 
 
-def revenue_plots(df):
+def revenue_plots(summary):
     tab1, tab2 = st.tabs(["Monthly Revenue Comparison", "Revenue Trend"])
     with tab1:
-        trend_data = df.groupby(by=[pd.Grouper(
-            key="order_purchase_timestamp", freq="MS"), "order_status"]).agg({"price": "sum"}).reset_index()
+        trend_data = summary["monthly"]
 
         fig = px.bar(trend_data, x="order_purchase_timestamp",
                      y="price", color="order_status", labels={"order_status": "Order Status"},
@@ -36,8 +35,7 @@ def revenue_plots(df):
     with tab2:
         freq = st.selectbox("Select Frequency for Trend", options=[
             "Daily", "Weekly", "Monthly"])
-        trend_data = df.groupby(by=[pd.Grouper(
-            key="order_purchase_timestamp", freq=freq[0]), "order_status"]).agg({"price": "sum"}).reset_index()
+        trend_data = summary["trend"][freq]
         fig = px.line(trend_data, x="order_purchase_timestamp",
                       y="price", color="order_status", labels={"order_status": "Order Status"},
                       color_discrete_sequence=px.colors.qualitative.Plotly)
@@ -56,11 +54,7 @@ def revenue_plots(df):
     tab1, tab2 = st.tabs(["State Performance", "City Performance"])
 
     with tab1:
-        ss_df = (
-            df.groupby(by=["seller_state", "customer_state"])
-            .agg({"price": "sum"})
-            .reset_index()
-        )
+        ss_df = summary["state_pairs"]
 
         num1, num2, num3 = st.columns([1, 1, 1])
         with num1:
@@ -77,7 +71,7 @@ def revenue_plots(df):
             num_fal = st.slider(
                 f"Select No. of States to Show", min_value=5, max_value=ss_df[state_].nunique())
 
-        top_df = ss_df.groupby(by=state_).agg({"price": "sum"}).reset_index().sort_values(by="price", ascending=order_)[
+        top_df = summary["states"][state_].sort_values(by="price", ascending=order_)[
             :num_fal
         ]
 
@@ -92,7 +86,7 @@ def revenue_plots(df):
         top_value, avg, med, min_value, max_value = get_key_metrics(
             top_df, state_, "price")
 
-        overall = df["price"].sum()
+        overall = summary["overall"]["price"]
         perc = np.round(top_value / overall * 100)
 
         line1.markdown(
@@ -149,12 +143,9 @@ def revenue_plots(df):
         with num1:
             city = st.selectbox(f"Select City Type (Revenue)",
                                 options=["Customer City", "Seller City"])
-            city_ = "customer_city" if state == "Customer City" else "seller_city"
+            city_ = "customer_city" if city == "Customer City" else "seller_city"
 
-        cc_df = (
-            df.groupby(by=city_).agg(
-                {"price": "sum"}).reset_index()
-        )
+        cc_df = summary["cities"][city_]
         with num2:
             order = st.selectbox(f"Select City Sort Order (Revenue)",
                                  options=["Top", "Bottom"])
@@ -227,10 +218,7 @@ def revenue_plots(df):
                         config={"displayModeBar": False})
 
     # Products 
-    prod_df = (
-        df.groupby(by="product_category_name").agg(
-            {"price": "sum"}).reset_index()
-    )
+    prod_df = summary["categories"]
 
     num1, num2 = st.columns([1, 1])
 
@@ -305,11 +293,10 @@ def revenue_plots(df):
                     config={"displayModeBar": False})
 
 
-def volume_plots(df):
+def volume_plots(summary):
     tab1, tab2 = st.tabs(["Monthly Volume Comparison", "Volume Trend"])
     with tab1:
-        trend_data = df.groupby(by=[pd.Grouper(
-            key="order_purchase_timestamp", freq="MS"), "order_status"]).agg(num_products=("product_id", "count")).reset_index()
+        trend_data = summary["monthly"]
 
         fig = px.bar(trend_data, x="order_purchase_timestamp",
                      y="num_products", color="order_status", labels={"order_status": "Order Status"},
@@ -328,8 +315,7 @@ def volume_plots(df):
     with tab2:
         freq = st.selectbox("Select Frequency for Trend", options=[
             "Daily", "Weekly", "Monthly"])
-        trend_data = df.groupby(by=[pd.Grouper(
-            key="order_purchase_timestamp", freq=freq[0]), "order_status"]).agg(num_products=("product_id", "count")).reset_index()
+        trend_data = summary["trend"][freq]
         fig = px.line(trend_data, x="order_purchase_timestamp",
                       y="num_products", color="order_status", labels={"order_status": "Order Status"},
                       color_discrete_sequence=px.colors.qualitative.Bold)
@@ -348,11 +334,7 @@ def volume_plots(df):
     tab1, tab2 = st.tabs(["State Performance", "City Performance"])
 
     with tab1:
-        ss_df = (
-            df.groupby(by=["seller_state", "customer_state"])
-            .agg(num_products=("product_id", "count"))
-            .reset_index()
-        )
+        ss_df = summary["state_pairs"]
 
         num1, num2, num3 = st.columns([1, 1, 1])
         with num1:
@@ -369,7 +351,7 @@ def volume_plots(df):
             num_fal = st.slider(
                 f"Select No. of States to Show (Volume)", min_value=5, max_value=ss_df[state_].nunique())
 
-        top_df = ss_df.groupby(by=state_).agg({"num_products": "sum"}).reset_index().sort_values(
+        top_df = summary["states"][state_].sort_values(
             by="num_products", ascending=order_)[
             :num_fal
         ]
@@ -385,7 +367,7 @@ def volume_plots(df):
         top_value, avg, med, min_value, max_value = get_key_metrics(
             top_df, state_, "num_products")
 
-        overall = df["product_id"].count()
+        overall = summary["overall"]["num_products"]
         perc = np.round(top_value / overall * 100)
         line1.markdown(
             f"""##### The {order} {num_fal} {state}s Contributed :green[{perc}% ({data_parser.clean_format(top_value)} units)] of the Total Units :green[({data_parser.clean_format(overall)} units)]"""
@@ -442,12 +424,9 @@ def volume_plots(df):
         with num1:
             city = st.selectbox(f"Select City Type (Volume)",
                                 options=["Customer City", "Seller City"])
-            city_ = "customer_city" if state == "Customer City" else "seller_city"
+            city_ = "customer_city" if city == "Customer City" else "seller_city"
 
-        cc_df = (
-            df.groupby(by=city_).agg(num_products=(
-                "product_id", "count")).reset_index()
-        )
+        cc_df = summary["cities"][city_]
         with num2:
             order = st.selectbox(f"Select City Sort Order (Volume)",
                                  options=["Top", "Bottom"])
@@ -517,10 +496,7 @@ def volume_plots(df):
         st.plotly_chart(fig, use_container_width=True,
                         config={"displayModeBar": False})
 
-    prod_df = (
-        df.groupby(by="product_category_name").agg(
-            num_products=("product_id", "count")).reset_index()
-    )
+    prod_df = summary["categories"]
 
     num1, num2 = st.columns([1, 1])
 
@@ -0,0 +1,162 @@
+import argparse
+import datetime as dt
+import json
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from pycaret.classification import (
+    create_model, finalize_model, get_config, plot_model, predict_model, pull, save_model, setup)
+from sklearn.base import clone
+from . import data_parser, ml_models
+from .model_registry import file_sha256
+from .scorer import Scorer
+
+
+PLOTS = ["auc", "confusion_matrix", "class_report"]
+
+# Stand-in for a category the encoders have not seen, when probing them
+UNSEEN = "\0unseen"
+
+
+def churn_frame(churn_days=90):
+    # Same rows and churn label as the Customer Analytics page with no sidebar filters applied
+    customer_df = data_parser.read_data(add_geo_location=True)
+
+    # A row is churned when its customer's last purchase is before the cutoff (customer-level table)
+    customers = data_parser.read_customer_level(columns=["customer_unique_id", "last_purchase"])
+    positions, _ = data_parser.key_positions(customers["customer_unique_id"].to_numpy(),
+                                             customer_df["customer_unique_id"].to_numpy())
+    last_purchase = customers["last_purchase"].to_numpy()
+    cutoff = last_purchase.max() - np.timedelta64(churn_days, "D")
+    customer_df["Churn"] = (last_purchase[positions] < cutoff).astype(int)
+    return customer_df
+
+
+def fitted_categories(pipeline):
+    # Categories each column's category_encoders step was fit on
+    categories = {}
+    for _, step in pipeline.steps[:-1]:
+        encoder = getattr(getattr(step, "transformer", step), "ordinal_encoder", None)
+        for mapping in getattr(encoder, "mapping", None) or []:
+            known = [value for value in mapping["mapping"].index if pd.notna(value)]
+            categories[mapping["col"]] = list(dict.fromkeys(categories.get(mapping["col"], []) + known))
+    return categories
+
+
+def build_scorer(pipeline):
+    # Reads the fitted preprocessing off the pipeline by transforming probe rows with its own steps:
+    # one row with every numeric input missing (giving the imputed values), then per categorical input
+    # a row for each known category, an unseen one and a missing one (giving its encoded columns)
+    categories = fitted_categories(pipeline)
+    numeric = [column for column in ml_models.MODEL_FEATURES if column not in ml_models.CATEGORICAL_FEATURES]
+    base = {column: categories[column][0] for column in ml_models.CATEGORICAL_FEATURES}
+    probes = [pd.DataFrame({**base, **dict.fromkeys(numeric, np.nan)}, index=[0])]
+    for column in ml_models.CATEGORICAL_FEATURES:
+        values = categories[column] + [UNSEEN, np.nan]
+        probes.append(pd.DataFrame({**base, **dict.fromkeys(numeric, 0.0), column: values}))
+    probe = pd.concat(probes, ignore_index=True)[ml_models.MODEL_FEATURES]
+
+    for _, step in pipeline.steps[:-1]:
+        probe = step.transform(probe)
+
+    fill_values = probe.loc[0, numeric].dropna().to_dict()
+    tables, start = {}, 1
+    for column in ml_models.CATEGORICAL_FEATURES:
+        outputs = [output for output in probe.columns if output == column or (
+            output.startswith(f"{column}_") and output not in ml_models.MODEL_FEATURES)]
+        rows = len(categories[column]) + 2
+        tables[column] = (outputs, probe.iloc[start:start + rows][outputs].to_numpy(dtype=float))
+        start += rows
+    return Scorer(pipeline.steps[-1][1], fill_values, categories, tables)
+
+
+def export_scorer(pipeline, X, path):
+    # Writes the pipeline's Scorer to path only if it predicts exactly what the pipeline does on X
+    scorer = build_scorer(pipeline)
+    matches = bool(np.array_equal(scorer.predict_proba(X), pipeline.predict_proba(X)))
+    if matches:
+        joblib.dump(scorer, path)
+    return matches
+
+
+def train(churn_days=90, models_dir=ml_models.MODELS_DIR, base_model=ml_models.BUNDLED_SCORER):
+    version = dt.datetime.now().strftime("%Y%m%d-%H%M%S")
+    out_dir = os.path.join(models_dir, version)
+    plots_dir = os.path.join(out_dir, "plots")
+    os.makedirs(plots_dir)
+
+    df_model = ml_models.model_frame(churn_frame(churn_days))
+    setup(
+        data=df_model,
+        target="Churn",
+        categorical_features=ml_models.CATEGORICAL_FEATURES,
+        session_id=123,
+        verbose=False,
+    )
+
+    # Refit the estimator pycaret previously selected, taken from its pycaret-free scorer
+    estimator = clone(joblib.load(base_model).estimator)
+    model = create_model(estimator, verbose=False)
+    cv_metrics = pull()
+    predict_model(model, verbose=False)
+    pycaret_holdout = pull()
+
+    for plot in PLOTS:
+        plot_model(model, plot, scale=1, plot_kwargs={"percent": True}, save=plots_dir)
+
+    final_model = finalize_model(model)
+    save_model(final_model, os.path.join(out_dir, "model"), verbose=False)
+    # Pycaret-free copy of the saved pipeline, served only if it scores pycaret's holdout rows exactly
+    # as the saved pipeline does
+    scorer_matches = export_scorer(final_model, get_config("X_test"), os.path.join(out_dir, ml_models.SCORER_FILE))
+
+    info = {
+        "version": version,
+        "estimator": type(estimator).__name__,
+        "churn_days": churn_days,
+        "rows": len(df_model),
+        "trained_at": dt.datetime.now().isoformat(timespec="seconds"),
+        "data_version": [str(part) for part in data_parser.data_version(df_model, "training")],
+        "model_sha256": file_sha256(os.path.join(out_dir, "model.pkl")),
+        "scorer_matches_model": scorer_matches,
+        "cv_metrics": cv_metrics.reset_index().to_dict(orient="records"),
+        "holdout_metrics": pycaret_holdout.to_dict(orient="records"),
+    }
+    with open(os.path.join(out_dir, "metrics.json"), "w") as f:
+        json.dump(info, f, indent=2, default=str)
+
+    # Point the dashboard at the new run only once every artifact is written
+    with open(os.path.join(models_dir, "LATEST"), "w") as f:
+        f.write(version)
+
+    print(f"Saved churn model {version} to {out_dir}")
+    return out_dir
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m helper_funcs.training",
+        description="Train the churn model offline and save the pipeline, metrics and plots")
+    parser.add_argument("--churn-days", type=int, default=90)
+    parser.add_argument("--models-dir", default=ml_models.MODELS_DIR)
+    parser.add_argument("--base-model", default=ml_models.BUNDLED_SCORER,
+                        help="Saved scorer whose estimator is refit")
+    parser.add_argument("--export", nargs=2, metavar=("PIPELINE", "SCORER"),
+                        help="Instead of training, write the scorer of a saved pycaret pipeline, e.g. "
+                             "best_model.pkl best_scorer.pkl, checked against the pipeline on every row")
+    args = parser.parse_args(argv)
+
+    if args.export:
+        pipeline_path, scorer_path = args.export
+        X = ml_models.model_frame(data_parser.read_data(add_geo_location=True))
+        if not export_scorer(joblib.load(pipeline_path), X, scorer_path):
+            raise SystemExit(f"{scorer_path} not written: its predictions differ from {pipeline_path}")
+        print(f"Wrote {scorer_path}, matching {pipeline_path} on {len(X):,} rows")
+        return
+
+    train(args.churn_days, args.models_dir, args.base_model)
+
+
+if __name__ == "__main__":
+    main()
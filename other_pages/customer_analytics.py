@@ -6,8 +6,7 @@ from helper_funcs import data_parser, styles, st_filters
 from streamlit_extras.metric_cards import style_metric_cards
 from streamlit_extras.annotated_text import annotated_text
 from helper_funcs.st_plots import get_key_metrics
-from helper_funcs import ml_models
-import datetime as dt
+from helper_funcs import ml_models, cohorts, customers, scoring
 
 st.set_page_config(page_icon="🧮", layout="wide", initial_sidebar_state="expanded")
 
@@ -15,44 +14,6 @@ styles.load_css_file("assets/styles/main.css")
 styles.set_png_as_page_bg("assets/img/olist_logo.png")
 
 
-@st.cache_data()
-def cohort_analysis(df):
-    # Churn Cohort Analysis
-    customer_df = df.loc[:, ["customer_unique_id", "order_purchase_timestamp"]]
-    customer_df = customer_df[~customer_df.duplicated()]
-    customer_df = customer_df[customer_df["customer_unique_id"].notnull()]
-
-    # Create the order_purchase_month period column
-    customer_df["order_purchase_month"] = customer_df["order_purchase_timestamp"].apply(
-        lambda x: dt.datetime(x.year, x.month, 1)
-    )
-    cohort = customer_df.groupby("customer_unique_id")["order_purchase_month"]
-    customer_df["CohortMonth"] = cohort.transform("min")
-
-    def get_date_int(df, column):
-        year = df[column].dt.year
-        month = df[column].dt.month
-        return year, month
-
-    # Get the integers for the date parts from the 'InvoiceMonth' column
-    invoice_year, invoice_month = get_date_int(customer_df, "order_purchase_month")
-
-    # Get the integers for date parts from the 'Cohortmonth' column
-    cohort_year, cohort_month = get_date_int(customer_df, "CohortMonth")
-
-    # Calculate difference in years
-    years_diff = invoice_year - cohort_year
-
-    # Calculate difference in months
-    months_diff = invoice_month - cohort_month
-
-    # Extract the difference in months from all previous values
-    customer_df["CohortIndex"] = years_diff * 12 + months_diff + 1
-    return customer_df
-
-
-df = data_parser.read_data(add_geo_location=True)
-
 # Sidebar Filters
 st.sidebar.header("Filters")
 st.sidebar.write("**Churn Period (Days)**")
@@ -69,62 +30,40 @@ st.sidebar.write("**View Revenue/Volume**")
 view = st.sidebar.selectbox(
     "view", options=["Revenue", "Volume"], key="view", label_visibility="collapsed"
 )
+add_freight = False
 if view == "price":
-    if st.sidebar.checkbox("Add Freight Value to Order"):
-        df["price"] = df["price"] + df["freight_value"]
-filters = st_filters.filter_widgets(df)
-df = st_filters.filter_data(df, *filters)
-
-
-customer_df = df[~df.duplicated()]
-customer_df = customer_df[customer_df["customer_unique_id"].notnull()]
-total_customers = customer_df["customer_unique_id"].nunique()
-
-# Count the number of unique customers who have made a purchase in the last 180 days
-customer_df["Churn"] = np.where(
-    customer_df["order_purchase_timestamp"]
-    >= customer_df["order_purchase_timestamp"].max() - pd.Timedelta(days=churn_days),
-    0,
-    1,
-)
+    add_freight = st.sidebar.checkbox("Add Freight Value to Order")
 
-retained_customers = customer_df.loc[
-    customer_df["Churn"] == 0, "customer_unique_id"
-].nunique()
+filters = st_filters.filter_widgets(st_filters.sidebar_options())
 
-# Calculate the customer retention rate as a percentage of the total customer base
-customer_retention_rate = retained_customers / total_customers * 100
-churn_rate = 100 - customer_retention_rate
+# Every column of the item rows (the churn model uses them all), but only the selected date range
+date_range = st_filters.date_range(filters)
+df = data_parser.read_data(add_geo_location=True, date_range=date_range)
+if add_freight:
+    df["price"] = df["price"] + df["freight_value"]
+version = data_parser.data_version(df, "customer_analytics", add_freight, *date_range)
+df = st_filters.filter_data(df, version, *filters)
 
-# Create a new dataframe containing only the orders that have been delivered
-delivered_orders = df.loc[df["order_delivered_customer_date"].notnull()]
 
-# Create a new dataframe containing only the first order for each customer
-first_orders = (
-    delivered_orders.sort_values("order_purchase_timestamp")
-    .groupby("customer_unique_id")
-    .first()
-    .reset_index()
-)
+customer_view = customers.customer_view(df, version, filters)
+customer_df = customer_view["rows"].copy(deep=False)
+customer_table = customer_view["customers"]
+total_customers = len(customer_table)
+if total_customers == 0:
+    st.header("Customer Insights 👪")
+    st.info("No customers match the selected filters.")
+    st.stop()
 
+# Customers whose last purchase falls inside the churn window
+churn_cutoff = customers.churn_cutoff(customer_table, churn_days)
+retained_customers = customers.retained_customers(customer_table, churn_days)
 
-# Create a new dataframe containing only the second order for each customer (if it exists)
-second_orders = pd.merge(
-    delivered_orders,
-    first_orders[["customer_unique_id", "order_purchase_timestamp"]],
-    on="customer_unique_id",
-    suffixes=["", "_first"],
-)
-second_orders = second_orders.loc[
-    (
-        second_orders["order_purchase_timestamp"]
-        < second_orders["order_purchase_timestamp_first"] + pd.Timedelta(days=365)
-    ),
-    :,
-]
+# Calculate the customer retention rate as a percentage of the total customer base
+customer_retention_rate = retained_customers / total_customers * 100
+churn_rate = 100 - customer_retention_rate
 
-# Count the number of unique customers who made a second purchase
-renewed_customers = len(second_orders["customer_unique_id"].unique())
+# Count the number of unique customers who made a purchase within a year of their first one
+renewed_customers = customers.renewed_customers(customer_view["delivered"], window_days=365)
 
 # Calculate the renewal rate as a percentage of the total number of customers
 renewal_rate = (renewed_customers / total_customers) * 100
@@ -132,34 +71,8 @@ renewal_rate = (renewed_customers / total_customers) * 100
 # Calculate the total revenue generated by all customers
 total_revenue = df["price"].sum()
 
-# Create a new dataframe containing only the orders that have been delivered
-delivered_orders = df.loc[df["order_delivered_customer_date"].notnull()]
-
-# Create a new dataframe containing only the first order for each customer
-first_orders = (
-    delivered_orders.sort_values("order_purchase_timestamp")
-    .groupby("customer_id")
-    .first()
-    .reset_index()
-)
-
-# Create a new dataframe containing only the second order for each customer (if it exists)
-second_orders = pd.merge(
-    delivered_orders,
-    first_orders[["customer_id", "order_purchase_timestamp"]],
-    on="customer_id",
-    suffixes=["", "_first"],
-)
-second_orders = second_orders.loc[
-    (
-        second_orders["order_purchase_timestamp"]
-        < second_orders["order_purchase_timestamp_first"] + pd.Timedelta(days=365)
-    ),
-    :,
-]
-
-# Calculate the total revenue generated by customers who made a second purchase
-renewal_revenue = second_orders["price"].sum()
+# Calculate the revenue of purchases made within a year of the customer's first one
+renewal_revenue = customers.renewal_revenue(customer_view["delivered"], window_days=365)
 
 # Calculate the revenue renewal rate as a percentage of the total revenue
 revenue_renewal_rate = renewal_revenue / total_revenue * 100
@@ -206,11 +119,7 @@ with tab1:
     freq = st.selectbox(
         "Select Frequency for Trend", options=["Daily", "Weekly", "Monthly"]
     )
-    cus_df = (
-        df.groupby(by=pd.Grouper(key="order_approved_at", freq=freq[0]))
-        .agg(Number_of_Customers=("customer_unique_id", "count"))
-        .reset_index()
-    )
+    cus_df = customer_view["trend"][freq]
 
     fig = px.line(cus_df, x="order_approved_at", y="Number_of_Customers")
     fig.update_layout(
@@ -222,12 +131,7 @@ with tab1:
 
 
 with tab2:
-    prod_df = df.drop_duplicates(subset="customer_unique_id")
-    prod_df = (
-        prod_df.groupby(by="product_category_name")
-        .agg(num_customers=("customer_unique_id", "count"))
-        .reset_index()
-    )
+    prod_df = customer_view["categories"]
 
     num1, num2 = st.columns([1, 1])
 
@@ -300,24 +204,7 @@ st.subheader("Churn/Retention Breakdown")
 st.write("#### Retention Cohort Analysis")
 
 # Churn/Retention Cohort Analysis
-cohort_df = cohort_analysis(df)
-grouping = cohort_df.groupby(["CohortMonth", "CohortIndex"])
-
-# Count the number of unique values per Customer ID
-cohort_data = grouping["customer_unique_id"].apply(pd.Series.nunique).reset_index()
-
-# Create a pivot
-cohort_counts = cohort_data.pivot(
-    index="CohortMonth", columns="CohortIndex", values="customer_unique_id"
-)
-cohort_counts.fillna(0, inplace=True)
-
-# Select the first column and store it to cohort_sizes
-cohort_sizes = cohort_counts.iloc[:, 0]
-
-# Divide the cohort count by cohort sizes along the rows
-
-retention = cohort_counts.divide(cohort_sizes, axis=0) * 100
+retention = cohorts.retention(df, version, filters)
 retention.index = retention.index.strftime("%Y-%B")
 
 colorscales = px.colors.named_colorscales()
@@ -365,7 +252,9 @@ variable_key = st.selectbox(
 )
 chosen_col = variables_dict[variable_key]
 
-payment_type_plt = customer_df.groupby(by=chosen_col).Churn.mean().reset_index()
+payment_type_plt = customers.churn_rates(
+    customer_view["profiles"][chosen_col], churn_cutoff, chosen_col
+)
 
 payment_type_plt.sort_values("Churn", ascending=False, inplace=True)
 fig = px.bar(
@@ -400,28 +289,10 @@ days_joined = st.columns(2)[0].select_slider(
     "Select Number of Days for Prediction", options=[60, 90, 180], value=60
 )
 
-mask = customer_df.columns.isin(
-    [
-        "order_id",
-        "customer_id",
-        "order_purchase_timestamp",
-        "order_approved_at",
-        "order_delivered_carrier_date",
-        "order_delivered_customer_date",
-        "order_estimated_delivery_date",
-        "order_item_id",
-        "product_id",
-        "seller_id",
-        "shipping_limit_date",
-        "customer_unique_id",
-        "geolocation_city_x",
-        "geolocation_city_y",
-        "geolocation_state_x",
-        "geolocation_state_y",
-    ]
-)
-df_model = customer_df.loc[:, ~(mask)].copy()
-df_model = df_model.astype({"customer_city": "category", "seller_city": "category"})
+# Churn label of each row's customer for the models below
+customer_df["Churn"] = customers.churn_labels(customer_table, customer_view["positions"], churn_days)
+
+df_model = ml_models.model_frame(customer_df)
 new_customers = customer_df.loc[
     (
         customer_df.order_purchase_timestamp
@@ -430,18 +301,28 @@ new_customers = customer_df.loc[
     :,
 ]
 
-df_pred = new_customers.loc[:, df_model.columns].drop("Churn", axis=1)
+df_pred = df_model.loc[new_customers.index].drop(columns="Churn")
+# Shown and matched to the churn scores by Olist id, not by surrogate key
+new_customers = new_customers.assign(
+    customer_unique_id=data_parser.decode_ids(new_customers["customer_unique_id"], "customer_unique_id")
+)
 
 st.write("Pycaret's Best Model")
-ml_models.pycaret_modelling(df_model)
+ml_models.show_training_artifacts()
 
 st.write("Prediction Using Pycaret Best Model")
-new_customers.loc[:, "churn_probability"] = ml_models.pycaret_prediction(df_pred)
-
-with st.expander(
-    f"Showing Predictions of {data_parser.clean_format(new_customers.shape[0])} Customers Who Made A Purchase in the Last {days_joined} Days"
-):
-    st.dataframe(new_customers[["customer_unique_id", "Churn", "churn_probability"]])
+# Scores come from the batch job (`python -m helper_funcs.scoring`), not inference on page load
+scores = scoring.read_scores()
+if scores is None:
+    st.info("No churn scores yet. Run `python -m helper_funcs.scoring` to score customers.")
+else:
+    scored_customers = new_customers[["customer_unique_id", "Churn"]].merge(
+        scores, how="left", on="customer_unique_id"
+    )
+    with st.expander(
+        f"Showing Predictions of {data_parser.clean_format(scored_customers.shape[0])} Customers Who Made A Purchase in the Last {days_joined} Days"
+    ):
+        st.dataframe(scored_customers)
 
 st.write("Using Standalone Models")
 selected_key = st.selectbox(
@@ -479,7 +360,11 @@ with col1:
 
     geo_df = df.groupby(by=["customer_lat", "customer_lng"]).first().reset_index()
     geo_df = ml_models.cluster(
-        n_clusters=n_clusters, df=geo_df, columns=["customer_lat", "customer_lng"]
+        n_clusters=n_clusters,
+        df=geo_df,
+        key=st_filters.filter_key(version, filters),
+        columns=["customer_lat", "customer_lng"],
+        max_points=ml_models.CLUSTER_POINT_BUDGET,
     )
 
     fig = px.scatter_mapbox(
@@ -515,7 +400,9 @@ with col2:
     geo_df = ml_models.cluster(
         n_clusters=n_clusters,
         df=geo_df,
+        key=st_filters.filter_key(version, filters),
         columns=["customer_lat", "customer_lng", "price"],
+        max_points=ml_models.CLUSTER_POINT_BUDGET,
     )
 
     fig = px.scatter_mapbox(
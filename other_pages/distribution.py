@@ -6,6 +6,7 @@ from helper_funcs import data_parser, styles, st_filters
 from streamlit_extras.metric_cards import style_metric_cards
 import plotly.graph_objects as go
 from helper_funcs import ml_models
+from helper_funcs.filter_index import DATE_COLS, FILTER_COLS
 
 
 st.set_page_config(page_icon="🧮", layout="wide",
@@ -14,8 +15,13 @@ st.set_page_config(page_icon="🧮", layout="wide",
 styles.load_css_file("assets/styles/main.css")
 styles.set_png_as_page_bg("assets/img/olist_logo.png")
 
-df = data_parser.read_data(add_geo_location=True)
-total_num_orders = df['order_id'].nunique()
+# Columns this page reads from the item rows. Dates are not pushed down: missing delivery
+# dates are filled in below before filtering.
+COLUMNS = FILTER_COLS + DATE_COLS + ["order_id", "product_id", "order_approved_at"]
+
+df = data_parser.read_data(add_geo_location=True, columns=COLUMNS)
+# Delivered orders are compared with all orders, one row each in the order fact
+total_num_orders = len(data_parser.read_orders(columns=["order_id"]))
 
 df = df[df['order_status'] == "delivered"]
 customer_date_null_mask = df['order_delivered_customer_date'].isna()
@@ -32,13 +38,13 @@ selectbox = st.sidebar.empty()
 
 
 st.sidebar.header("Filters")
-filters = st_filters.filter_widgets(df)
-df = st_filters.filter_data(df, *filters)
+version = data_parser.data_version(df, "distribution")
+filters = st_filters.filter_widgets(st_filters.filter_options(df, version))
+df = st_filters.filter_data(df, version, *filters)
 
 
 df["delivery_time"] = df["order_delivered_customer_date"] - df["order_approved_at"]
-clean_df = df.drop_duplicates(subset=["order_id", "product_id"]).copy()
-total_num = clean_df['order_id'].nunique()
+total_num = df['order_id'].nunique()
 avg_delivery_time = df["delivery_time"].mean().days
 avg_distance = df["distance_covered"].mean()
 
@@ -61,7 +67,8 @@ style_metric_cards()
 
 
 st.subheader("Visualization")
-clean_df = df.drop_duplicates(subset=["order_id", "product_id"]).copy()
+# One row per delivered item already
+clean_df = df.copy()
 clean_df['delivery_time'] = clean_df['delivery_time'].dt.days
 
 freq = st.selectbox("Select Frequency for Trend", options=[
@@ -164,7 +171,7 @@ colorscale = st.selectbox(
 col1, col2 = st.columns(2)
 
 with col1:
-    geo_df = clean_df.groupby(by=['customer_city', "customer_lat", "customer_lng"])[
+    geo_df = clean_df.groupby(by=['customer_city', "customer_lat", "customer_lng"], observed=True)[
         'delivery_time'].mean().reset_index()
 
     fig = px.density_mapbox(geo_df, lat="customer_lat", lon="customer_lng", z="delivery_time", radius=10, zoom=3.5,
@@ -186,8 +193,9 @@ with col2:
     geo_df = clean_df.groupby(by=["customer_lat", "customer_lng"])[
         'distance_covered'].mean().reset_index()
 
-    geo_df = ml_models.cluster(n_clusters=n_clusters, df=geo_df, columns=[
-                               "customer_lat", "customer_lng", "distance_covered"])
+    geo_df = ml_models.cluster(n_clusters=n_clusters, df=geo_df, key=st_filters.filter_key(version, filters),
+                               columns=["customer_lat", "customer_lng", "distance_covered"],
+                               max_points=ml_models.CLUSTER_POINT_BUDGET)
 
     fig = px.scatter_mapbox(geo_df, lat="customer_lat", lon="customer_lng", color="cluster",
                             labels={"distance_covered": "Distance Covered",
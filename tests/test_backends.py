@@ -0,0 +1,97 @@
+import datetime as dt
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_lookup_drops_keys_missing_from_the_table():
+    from helper_funcs.data_parser import lookup
+
+    orders = pd.DataFrame({"order_id": [2, 5, 7, 11], "status": list("abcd")})
+    assert list(lookup(orders, "order_id", [0, 2, 7, 8, 12])["status"]) == ["a", "c"]
+    # A contiguous key range
+    assert list(lookup(orders.iloc[1:3].assign(order_id=[5, 6]), "order_id", [4, 6, 7])["status"]) == ["c"]
+
+
+def filter_states(options, df):
+    # A few sidebar states: everything, the last 90 days, another date column with selections, and
+    # payment types (matched against every payment of an order)
+    first, last = options["dates"]["order_purchase_timestamp"]
+    top = lambda col, n: list(df[col].value_counts().index[:n])
+    return [
+        ["order_purchase_timestamp", first, last] + [[]] * 7,
+        ["order_purchase_timestamp", last - dt.timedelta(days=90), last] + [[]] * 7,
+        ["order_delivered_customer_date", first, last, ["delivered"], [], top("product_category_name", 3),
+         top("seller_city", 4), [], [], top("customer_state", 2)],
+        ["order_purchase_timestamp", first, last, [], ["voucher", "debit_card"], [], [], top("seller_state", 2),
+         [], []],
+    ]
+
+
+def tidy(result):
+    # Backend results with categoricals as strings, in one row order
+    if isinstance(result, dict):
+        return {key: tidy(value) for key, value in result.items()}
+    if isinstance(result, pd.Series):
+        return result.astype(float)
+    result = result.astype({col: str for col in result.columns if isinstance(result[col].dtype, pd.CategoricalDtype)})
+    return result.sort_values(list(result.columns)).reset_index(drop=True)
+
+
+def assert_same(expected, result):
+    if isinstance(expected, dict):
+        assert expected.keys() == result.keys()
+        for key in expected:
+            assert_same(expected[key], result[key])
+    elif isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(expected, result[expected.index], check_names=False, rtol=1e-5)
+    else:
+        pd.testing.assert_frame_equal(expected, result[expected.columns], check_dtype=False,
+                                      check_categorical=False, rtol=1e-5)
+
+
+def compare_backends(add_freight):
+    # Runs in a worker whose OLIST_DATA_DIR points at the synthetic dataset
+    from helper_funcs import backends
+
+    pandas_backend = backends.PandasBackend("test", add_freight=add_freight)
+    duckdb_backend = backends.DuckDBBackend("test", add_freight=add_freight)
+    options = pandas_backend.filter_options()
+    assert options["dates"] == duckdb_backend.filter_options()["dates"]
+
+    everything = ["order_purchase_timestamp", *options["dates"]["order_purchase_timestamp"]] + [[]] * 7
+    df = pandas_backend.frame(everything)[0]
+    for filters in filter_states(options, df):
+        assert_same(tidy(pandas_backend.summary(filters)), tidy(duckdb_backend.summary(filters)))
+        assert_same(tidy(pandas_backend.activity(filters, "order_approved_at")),
+                    tidy(duckdb_backend.activity(filters, "order_approved_at")))
+
+        rows, duckdb_rows = pandas_backend.rows(filters), duckdb_backend.rows(filters)
+        np.testing.assert_array_equal(rows["order_id"].to_numpy(), duckdb_rows["order_id"].to_numpy())
+        np.testing.assert_allclose(rows["price"].to_numpy(), duckdb_rows["price"].to_numpy(), rtol=1e-6)
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    from benchmarks.synthetic import write_dataset
+
+    path = str(tmp_path_factory.mktemp("synthetic"))
+    write_dataset(path, 20_000)
+    return path
+
+
+@pytest.mark.parametrize("add_freight", [False, True])
+def test_pandas_and_duckdb_backends_agree(data_dir, add_freight):
+    # The backends read the dataset at import, so the comparison runs in a worker like the benchmarks
+    env = dict(os.environ, OLIST_DATA_DIR=data_dir, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, "-c", f"from tests.test_backends import compare_backends; "
+                             f"compare_backends({add_freight})"], env=env, cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper_funcs import customers
+
+
+def test_no_customers_have_no_cutoff_and_none_retained():
+    table = pd.DataFrame({"customer_unique_id": pd.Series(dtype="int32"),
+                          "last_purchase": pd.Series(dtype="datetime64[ns]")})
+
+    assert customers.churn_cutoff(table, 90) is None
+    assert customers.retained_customers(table, 90) == 0
+
+
+def item_rows(n=3000, seed=0):
+    # Item rows of repeat customers over two years, 1-3 items per order
+    rng = np.random.default_rng(seed)
+    n_orders = n // 2
+    order_id = np.sort(rng.integers(0, n_orders, n)).astype("int32")
+    purchase = pd.Timestamp("2017-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 730 * 24, n_orders)), unit="h")
+    customer = rng.integers(0, 400, n_orders).astype("int32")
+    return pd.DataFrame({
+        "order_id": order_id,
+        "customer_unique_id": customer[order_id],
+        "order_purchase_timestamp": purchase[order_id],
+        "order_approved_at": purchase[order_id],
+        "order_delivered_customer_date": purchase[order_id],
+        "customer_state": np.array(["SP", "RJ", "MG", "BA"])[customer[order_id] % 4],
+        "seller_state": np.array(["SP", "PR"])[rng.integers(0, 2, n)],
+        "price": rng.gamma(2, 50, n).round(2),
+    })
+
+
+def customer_rows(rows):
+    table = customers.customer_table(customers.order_view(rows))
+    return table, customers.customer_positions(rows, table)
+
+
+@pytest.mark.parametrize("churn_days", [30, 90, 365])
+def test_retained_customers_purchased_inside_the_window(churn_days):
+    rows = item_rows()
+    table, _ = customer_rows(rows)
+
+    cutoff = rows["order_purchase_timestamp"].max() - pd.Timedelta(days=churn_days)
+    assert customers.churn_cutoff(table, churn_days) == cutoff
+    expected = rows.loc[rows["order_purchase_timestamp"] >= cutoff, "customer_unique_id"].nunique()
+    assert customers.retained_customers(table, churn_days) == expected
+
+
+@pytest.mark.parametrize("churn_days", [30, 90, 365])
+def test_churn_labels_are_their_customers(churn_days):
+    rows = item_rows(seed=1)
+    table, positions = customer_rows(rows)
+
+    cutoff = rows["order_purchase_timestamp"].max() - pd.Timedelta(days=churn_days)
+    last_purchase = rows.groupby("customer_unique_id")["order_purchase_timestamp"].transform("max")
+    np.testing.assert_array_equal(customers.churn_labels(table, positions, churn_days),
+                                  np.where(last_purchase >= cutoff, 0, 1))
+
+
+@pytest.mark.parametrize("col", ["customer_state", "seller_state"])
+def test_churn_rates_are_the_mean_label_per_value(col):
+    rows = item_rows(seed=2)
+    table, positions = customer_rows(rows)
+    profile = customers.churn_profile(rows, col, table["last_purchase"].to_numpy()[positions])
+
+    for churn_days in [30, 180]:
+        rates = customers.churn_rates(profile, customers.churn_cutoff(table, churn_days), col)
+        expected = (rows.assign(Churn=customers.churn_labels(table, positions, churn_days))
+                    .groupby(col)["Churn"].mean())
+        np.testing.assert_allclose(rates.set_index(col)["Churn"].loc[expected.index], expected)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.cluster import hierarchy
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.metrics import adjusted_rand_score
+
+from helper_funcs.ml_models import cluster_labels, cluster_tree, grid_points, linkage_tree, weighted_ward
+
+
+def points(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(-30, 0, size=(5, 2))
+    return centres[rng.integers(0, 5, n)] + rng.normal(scale=1.5, size=(n, 2))
+
+
+def test_weighted_ward_with_unit_weights_is_scipy_ward():
+    X = points()
+    expected = hierarchy.ward(X)
+    linkage = weighted_ward(X, np.ones(len(X)))
+
+    np.testing.assert_array_equal(linkage[:, :2], expected[:, :2])
+    np.testing.assert_allclose(linkage[:, 2:], expected[:, 2:], rtol=1e-9)
+    for n_clusters in range(2, 7):
+        np.testing.assert_array_equal(hierarchy.cut_tree(linkage, n_clusters=n_clusters),
+                                      hierarchy.cut_tree(expected, n_clusters=n_clusters))
+
+
+def test_weighted_ward_heights_are_ward_on_the_points_each_weight_stands_for():
+    rng = np.random.default_rng(1)
+    X, weights = points(60, seed=1), rng.integers(1, 5, 60)
+    expanded = hierarchy.ward(np.repeat(X, weights, axis=0))
+
+    # Merging the coincident copies costs nothing; the remaining merges are the weighted ones
+    heights = np.sort(expanded[:, 2])[len(expanded) - (len(X) - 1):]
+    np.testing.assert_allclose(np.sort(weighted_ward(X, weights)[:, 2]), heights, rtol=1e-9, atol=1e-9)
+
+
+def test_exact_ward_unless_scalable_mode_is_requested_and_needed():
+    X = points(500)
+    for max_points in [None, 500]:
+        linkage, assignment = linkage_tree(X, max_points)
+        np.testing.assert_array_equal(linkage, hierarchy.ward(X))
+        np.testing.assert_array_equal(assignment, np.arange(len(X)))
+
+    linkage, assignment = linkage_tree(X, 499, representatives=100)
+    assert len(linkage) + 1 <= 100
+    assert assignment.max() == len(linkage)
+
+
+def test_grid_points_keep_every_point_and_the_budget():
+    X = points(2000, seed=2)
+    means, counts, assignment = grid_points(X, 150)
+
+    assert len(means) <= 150
+    assert counts.sum() == len(X)
+    np.testing.assert_allclose(means[3], X[assignment == 3].mean(axis=0))
+
+
+@pytest.mark.parametrize("n_clusters", [2, 3, 5])
+def test_cut_tree_labels_partition_like_agglomerative_clustering(n_clusters):
+    X = points(400, seed=3)
+    expected = AgglomerativeClustering(n_clusters=n_clusters, linkage="ward").fit(X).labels_
+
+    assert adjusted_rand_score(cluster_labels(X, n_clusters), expected) == 1.0
+
+
+def test_cluster_tree_is_cached_on_the_key_not_the_frame():
+    cluster_tree.clear()
+    df = pd.DataFrame(points(80, seed=4), columns=["lat", "lng"])
+    linkage, _ = cluster_tree(df, ("version", "filters"), ["lat", "lng"])
+
+    # Same key: the cached tree, whatever frame is passed
+    cached, _ = cluster_tree(df.iloc[:40], ("version", "filters"), ["lat", "lng"])
+    np.testing.assert_array_equal(cached, linkage)
+
+    other, _ = cluster_tree(df.iloc[:40], ("version", "other filters"), ["lat", "lng"])
+    assert len(other) == 39
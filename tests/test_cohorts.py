@@ -0,0 +1,76 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+
+from helper_funcs.cohorts import retention_matrix
+
+
+def legacy_retention(df):
+    # The Customer Analytics page's original cohort analysis, verbatim
+    customer_df = df.loc[:, ["customer_unique_id", "order_purchase_timestamp"]]
+    customer_df = customer_df[~customer_df.duplicated()]
+    customer_df = customer_df[customer_df["customer_unique_id"].notnull()]
+
+    customer_df["order_purchase_month"] = customer_df["order_purchase_timestamp"].apply(
+        lambda x: dt.datetime(x.year, x.month, 1)
+    )
+    cohort = customer_df.groupby("customer_unique_id")["order_purchase_month"]
+    customer_df["CohortMonth"] = cohort.transform("min")
+
+    def get_date_int(df, column):
+        year = df[column].dt.year
+        month = df[column].dt.month
+        return year, month
+
+    invoice_year, invoice_month = get_date_int(customer_df, "order_purchase_month")
+    cohort_year, cohort_month = get_date_int(customer_df, "CohortMonth")
+    years_diff = invoice_year - cohort_year
+    months_diff = invoice_month - cohort_month
+    customer_df["CohortIndex"] = years_diff * 12 + months_diff + 1
+
+    grouping = customer_df.groupby(["CohortMonth", "CohortIndex"])
+    cohort_data = grouping["customer_unique_id"].apply(pd.Series.nunique).reset_index()
+    cohort_counts = cohort_data.pivot(
+        index="CohortMonth", columns="CohortIndex", values="customer_unique_id"
+    )
+    cohort_counts.fillna(0, inplace=True)
+    cohort_sizes = cohort_counts.iloc[:, 0]
+    return cohort_counts.divide(cohort_sizes, axis=0) * 100
+
+
+def purchases(n=4000, seed=0):
+    # Repeat customers over two years, with gaps in the months some cohorts come back in
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "customer_unique_id": rng.integers(0, 600, n).astype("int32"),
+        "order_purchase_timestamp": pd.Timestamp("2016-10-01")
+        + pd.to_timedelta(rng.integers(0, 700 * 24, n), unit="h"),
+    })
+
+
+def test_retention_matrix_matches_the_legacy_cohort_analysis():
+    for seed in range(3):
+        df = purchases(seed=seed)
+        expected = legacy_retention(df)
+        matrix = retention_matrix(df)
+
+        np.testing.assert_array_equal(matrix.index.to_numpy(dtype="datetime64[ns]"),
+                                      expected.index.to_numpy(dtype="datetime64[ns]"))
+        np.testing.assert_array_equal(matrix.columns, expected.columns)
+        np.testing.assert_allclose(matrix.to_numpy(), expected.to_numpy())
+
+
+def test_sparse_cohorts_keep_only_the_offsets_that_occur():
+    df = pd.DataFrame({
+        "customer_unique_id": [1, 1, 2, 3],
+        "order_purchase_timestamp": pd.to_datetime(["2017-01-05", "2017-04-20", "2017-01-30", "2017-04-01"]),
+    })
+    matrix = retention_matrix(df)
+
+    assert list(matrix.columns) == [1, 4]
+    np.testing.assert_allclose(matrix.to_numpy(), [[100.0, 50.0], [100.0, 0.0]])
+
+
+def test_no_purchases_give_an_empty_matrix():
+    assert retention_matrix(purchases().iloc[:0]).empty
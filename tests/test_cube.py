@@ -0,0 +1,115 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper_funcs.cube import build_cube, query_cube
+from helper_funcs.data_parser import payment_type_sets
+
+PAYMENT_TYPES = ["credit_card", "boleto", "voucher", "debit_card"]
+METRICS = ["price", "freight_value", "num_products"]
+
+
+def item_rows(n_orders=400, seed=0):
+    # Item rows in purchase order, 1-3 items per order, and 1-3 payment types per order
+    rng = np.random.default_rng(seed)
+    order_id = np.repeat(np.arange(n_orders, dtype="int32"), rng.integers(1, 4, n_orders))
+    n = len(order_id)
+    purchase = pd.Timestamp("2018-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 60 * 24, n_orders)), unit="h")
+    per_order = lambda values: np.asarray(values)[rng.integers(0, len(values), n_orders)][order_id]
+    rows = pd.DataFrame({
+        "order_id": order_id,
+        "order_purchase_timestamp": purchase[order_id],
+        "order_status": per_order(["delivered", "shipped", "canceled"]),
+        "customer_state": per_order(["SP", "RJ", "MG"]),
+        "product_category_name": np.array(["toys", "auto", "books"])[rng.integers(0, 3, n)],
+        "seller_state": np.array(["SP", "PR"])[rng.integers(0, 2, n)],
+        "product_id": np.arange(n),
+        "price": rng.gamma(2, 50, n).round(2),
+        "freight_value": rng.gamma(2, 10, n).round(2),
+    })
+    pairs = pd.DataFrame({"order_id": np.arange(n_orders, dtype="int32"), "count": rng.integers(1, 4, n_orders)})
+    pairs = pairs.loc[pairs.index.repeat(pairs["count"]), ["order_id"]].reset_index(drop=True)
+    pairs["payment_type"] = np.array(PAYMENT_TYPES)[rng.integers(0, 4, len(pairs))]
+    return rows, pairs.drop_duplicates(ignore_index=True)
+
+
+def filters(start=dt.date(2018, 1, 1), end=dt.date(2018, 3, 31), order_status=(), payment_type=(),
+            product_category_name=(), seller_state=(), customer_state=()):
+    return ["order_purchase_timestamp", start, end, list(order_status), list(payment_type),
+            list(product_category_name), [], list(seller_state), [], list(customer_state)]
+
+
+def filter_rows(rows, pairs, state):
+    # The row-level filter: payment types match any payment of the order
+    _, start, end, order_status, payment_type, category, _, seller_state, _, customer_state = state
+    days = rows["order_purchase_timestamp"].dt.floor("D")
+    mask = (days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))
+    for col, selected in [("order_status", order_status), ("product_category_name", category),
+                          ("seller_state", seller_state), ("customer_state", customer_state)]:
+        if selected:
+            mask &= rows[col].isin(selected)
+    if payment_type:
+        mask &= rows["order_id"].isin(pairs.loc[pairs["payment_type"].isin(payment_type), "order_id"])
+    return rows[mask]
+
+
+def test_payment_type_sets_label_every_type_of_the_order():
+    pairs = pd.DataFrame({"order_id": [1, 1, 2, 3, 3], "payment_type": ["voucher", "credit_card", "boleto",
+                                                                        "voucher", "voucher"]})
+    assert list(payment_type_sets([3, 1, 2, 4, 1], pairs)) == [
+        "voucher", "credit_card|voucher", "boleto", "", "credit_card|voucher"]
+
+
+def test_cube_holds_each_row_once():
+    rows, pairs = item_rows()
+    cube = build_cube(rows, pairs)
+
+    assert cube["num_products"].sum() == len(rows)
+    assert cube["price"].sum() == pytest.approx(rows["price"].sum())
+    assert cube["num_orders"].sum() == rows["order_id"].nunique()
+
+
+@pytest.mark.parametrize("state", [
+    filters(),
+    filters(payment_type=["voucher"]),
+    filters(payment_type=["voucher", "boleto"], order_status=["delivered"]),
+    filters(start=dt.date(2018, 1, 15), end=dt.date(2018, 2, 10), customer_state=["SP", "MG"]),
+    filters(payment_type=["debit_card"], product_category_name=["toys"], seller_state=["PR"]),
+])
+def test_sliced_cube_matches_rolling_up_the_filtered_rows(state):
+    rows, pairs = item_rows(seed=3)
+    expected = build_cube(filter_rows(rows, pairs, state), pairs)
+    sliced = query_cube(build_cube(rows, pairs), state)
+
+    by = ["order_purchase_timestamp", "order_status", "seller_state"]
+    pd.testing.assert_frame_equal(
+        sliced.groupby(by)[METRICS].sum().sort_index(),
+        expected.groupby(by)[METRICS].sum().sort_index(),
+        check_exact=False)
+
+
+@pytest.mark.parametrize("state", [
+    filters(),
+    filters(payment_type=["credit_card", "voucher"]),
+    filters(start=dt.date(2018, 2, 1), order_status=["shipped"], customer_state=["RJ"]),
+])
+def test_order_counts_roll_up_over_order_level_filters(state):
+    rows, pairs = item_rows(seed=5)
+    filtered = filter_rows(rows, pairs, state)
+    sliced = query_cube(build_cube(rows, pairs), state)
+
+    assert sliced["num_orders"].sum() == filtered["order_id"].nunique()
+    daily = sliced.groupby("order_purchase_timestamp")["num_orders"].sum()
+    expected = filtered.groupby(filtered["order_purchase_timestamp"].dt.floor("D"))["order_id"].nunique()
+    pd.testing.assert_series_equal(daily, expected, check_names=False, check_dtype=False)
+
+
+def test_order_counts_under_an_item_level_filter_count_orders_by_their_first_item():
+    rows, pairs = item_rows(seed=7)
+    sliced = query_cube(build_cube(rows, pairs), filters(product_category_name=["toys"]))
+
+    first_items = rows.drop_duplicates("order_id")
+    assert sliced["num_orders"].sum() == (first_items["product_category_name"] == "toys").sum()
+    assert sliced["num_orders"].sum() <= rows.loc[rows["product_category_name"] == "toys", "order_id"].nunique()
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+
+from helper_funcs.data_parser import dataset_version, partition_dir
+
+
+def write_part(data_dir, table, month, n):
+    path = partition_dir(os.path.join(data_dir, table), 2018, month)
+    os.makedirs(path, exist_ok=True)
+    pd.DataFrame({"order_id": range(n)}).to_parquet(os.path.join(path, "part-0.parquet"))
+
+
+def test_rewriting_a_part_file_changes_the_version(tmp_path):
+    for month in [1, 2]:
+        write_part(tmp_path, "orders", month, 10)
+        write_part(tmp_path, "items", month, 20)
+    pd.DataFrame({"order_id": [1]}).to_parquet(tmp_path / "payments.parquet")
+    version = dataset_version(tmp_path)
+    orders_mtime = os.path.getmtime(tmp_path / "orders")
+
+    assert dataset_version(tmp_path) == version
+
+    # A rebuilt month leaves the fact directory's mtime alone
+    write_part(tmp_path, "items", 2, 25)
+    assert os.path.getmtime(tmp_path / "orders") == orders_mtime
+    assert dataset_version(tmp_path) != version
+
+    version = dataset_version(tmp_path)
+    write_part(tmp_path, "orders", 3, 10)
+    assert dataset_version(tmp_path) != version
+
+    version = dataset_version(tmp_path)
+    pd.DataFrame({"order_id": [1, 2]}).to_parquet(tmp_path / "payments.parquet")
+    assert dataset_version(tmp_path) != version
+
+
+def test_unrelated_files_leave_the_version_alone(tmp_path):
+    write_part(tmp_path, "orders", 1, 10)
+    version = dataset_version(tmp_path)
+
+    pd.DataFrame({"score": [0.5]}).to_parquet(tmp_path / "churn_scores.parquet")
+    assert dataset_version(tmp_path) == version
@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+import pytest
+from haversine import haversine, Unit
+
+from helper_funcs.data_parser import distance_miles
+
+# (origin, destination) pairs in (lat, lng): Olist customer/seller cities, identical points,
+# antipodes and the poles
+PAIRS = [
+    ((-23.55, -46.63), (-22.91, -43.17)),
+    ((-3.73, -38.52), (-30.03, -51.23)),
+    ((-15.79, -47.88), (-15.79, -47.88)),
+    ((0.0, 0.0), (0.0, 180.0)),
+    ((-23.55, -46.63), (23.55, 133.37)),
+    ((90.0, 0.0), (-90.0, 0.0)),
+    ((10.0, 179.9), (10.0, -179.9)),
+]
+
+
+def test_matches_scalar_haversine():
+    origins, destinations = zip(*PAIRS)
+    expected = [haversine(a, b, unit=Unit.MILES) for a, b in PAIRS]
+    np.testing.assert_allclose(distance_miles(origins, destinations), expected, rtol=1e-12, atol=1e-9)
+
+
+def test_identical_points_are_zero():
+    points = np.array([pair[0] for pair in PAIRS])
+    np.testing.assert_allclose(distance_miles(points, points), 0.0, atol=1e-9)
+
+
+def test_antipodes_are_half_the_circumference():
+    half = haversine((0.0, 0.0), (0.0, 180.0), unit=Unit.MILES)
+    assert half == pytest.approx(math.pi * 3958.8, rel=1e-4)
+    assert distance_miles([(0.0, 0.0)], [(0.0, 180.0)])[0] == pytest.approx(half, rel=1e-12)
+
+
+def test_missing_coordinates_give_nan():
+    # Rows with a missing coordinate come out as NaN without affecting the other rows
+    origins = [(np.nan, -46.63), (-23.55, -46.63), (-23.55, np.nan)]
+    destinations = [(-22.91, -43.17), (-22.91, -43.17), (-22.91, -43.17)]
+    result = distance_miles(origins, destinations)
+    assert np.isnan(result[0]) and np.isnan(result[2])
+    assert math.isnan(haversine(origins[0], destinations[0], unit=Unit.MILES))
+    assert result[1] == pytest.approx(haversine(origins[1], destinations[1], unit=Unit.MILES), rel=1e-12)
+
+
+def test_empty_input():
+    assert distance_miles([], []).shape == (0,)
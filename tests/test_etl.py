@@ -0,0 +1,102 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import orders_frame
+from helper_funcs.data_parser import ID_COLS, ROW_COLS, read_star
+from helper_funcs.etl import encode_ids, item_level, write_star
+
+
+def joined_rows(n=600, seed=0):
+    # Joined rows with hex ids, several items per order and repeat customers, sellers and products
+    rng = np.random.default_rng(seed)
+    hex_ids = lambda prefix, count: np.array([f"{prefix}{i:031x}" for i in rng.permutation(count)], dtype=object)
+    orders = rng.integers(0, 200, n)
+    order_ids, customers = hex_ids("a", 200), rng.integers(0, 120, 200)
+    purchase = pd.Timestamp("2017-01-01") + pd.to_timedelta(rng.integers(0, 90, 200), unit="D")
+    return pd.DataFrame({
+        "order_id": order_ids[orders],
+        "customer_id": hex_ids("c", 120)[customers][orders],
+        "customer_unique_id": hex_ids("u", 120)[customers // 2][orders],
+        "product_id": hex_ids("p", 50)[rng.integers(0, 50, n)],
+        "seller_id": hex_ids("s", 20)[rng.integers(0, 20, n)],
+        "order_purchase_timestamp": purchase[orders],
+    })
+
+
+def test_keys_do_not_depend_on_the_row_order(tmp_path):
+    rows = joined_rows()
+    encoded = encode_ids(rows.copy(), tmp_path / "a")
+    shuffled = encode_ids(rows.sample(frac=1, random_state=1).copy(), tmp_path / "b").sort_index()
+
+    pd.testing.assert_frame_equal(encoded, shuffled)
+    for col in ID_COLS:
+        pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "a" / f"{col}.parquet"),
+                                      pd.read_parquet(tmp_path / "b" / f"{col}.parquet"))
+
+
+def test_keys_decode_to_the_ids_and_order_keys_follow_purchase_order(tmp_path):
+    rows = joined_rows(seed=2)
+    encoded = encode_ids(rows.copy(), tmp_path)
+
+    for col in ID_COLS:
+        assert encoded[col].dtype == "int32"
+        ids = pd.read_parquet(tmp_path / f"{col}.parquet")[col].to_numpy()
+        np.testing.assert_array_equal(ids[encoded[col].to_numpy()], rows[col].to_numpy())
+
+    orders = encoded.drop_duplicates("order_id").sort_values("order_id")
+    assert orders["order_purchase_timestamp"].is_monotonic_increasing
+    assert list(orders["order_id"]) == list(range(len(orders)))
+
+
+@pytest.fixture(scope="module")
+def star(tmp_path_factory):
+    # Joined rows with hex ids, written as the ETL does: keys, purchase order, then the star tables.
+    # Every third order has a second payment, which repeats its items in the join.
+    data_dir = tmp_path_factory.mktemp("star")
+    rows = orders_frame(5000, seed=3)
+    second = rows[rows["order_id"] % 3 == 0].assign(payment_sequential=np.int16(2), payment_value=5.0)
+    second.loc[:, "payment_type"] = "voucher"
+    rows = pd.concat([rows, second], ignore_index=True)
+    for col in ID_COLS:
+        rows[col] = np.array([f"{col[0]}{key:031x}" for key in range(rows[col].max() + 1)], dtype=object)[rows[col]]
+    encoded = encode_ids(rows.copy(), data_dir / "ids")
+    order = np.lexsort((encoded["payment_sequential"], encoded["order_item_id"], encoded["order_id"]))
+    write_star(encoded.take(order).reset_index(drop=True), str(data_dir))
+    return data_dir, item_level(rows.take(order).reset_index(drop=True))
+
+
+@pytest.mark.parametrize("columns, date_range", [
+    (None, None),
+    (["price", "product_category_name"], None),
+    (["order_id", "customer_state", "seller_city", "payment_type"],
+     ("order_purchase_timestamp", dt.date(2017, 3, 1), dt.date(2017, 9, 30))),
+    (["customer_unique_id", "price"], ("order_delivered_customer_date", dt.date(2017, 6, 1), dt.date(2018, 1, 15))),
+])
+def test_star_join_reads_back_the_item_rows_and_their_ids(star, columns, date_range):
+    data_dir, expected = star
+    rows = read_star(str(data_dir), columns, date_range)
+
+    if date_range is not None:
+        date_col, start, end = date_range
+        days = expected[date_col].dt.floor("D")
+        expected = expected[(days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))]
+    expected = expected[ROW_COLS if columns is None else columns].reset_index(drop=True)
+    for col in ID_COLS:
+        if col in rows.columns:
+            rows[col] = pd.read_parquet(data_dir / "ids" / f"{col}.parquet")[col].to_numpy()[rows[col]]
+
+    assert list(rows.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(rows, expected, check_dtype=False, check_categorical=False)
+
+
+def test_payments_do_not_repeat_item_rows(star):
+    data_dir, expected = star
+    payments = pd.read_parquet(data_dir / "payments.parquet")
+    assert payments.duplicated("order_id").any()
+
+    rows = read_star(str(data_dir), ["order_id", "price"])
+    assert len(rows) == len(expected) == 5000
+    assert rows["price"].sum() == pytest.approx(expected["price"].sum())
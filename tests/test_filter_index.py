@@ -0,0 +1,81 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helper_funcs.data_parser import payment_types
+from helper_funcs.filter_index import DATE_COLS, FILTER_COLS, FilterIndex
+
+PAYMENT_TYPES = ["credit_card", "boleto", "voucher", "debit_card"]
+
+
+def item_rows(n=2000, seed=0):
+    # Item rows with missing dates and values, and their orders' (order, payment type) pairs
+    rng = np.random.default_rng(seed)
+    pick = lambda values: pd.Categorical(np.array(values, dtype=object)[rng.integers(0, len(values), n)])
+    start = pd.Timestamp("2017-01-01")
+    dates = {col: (start + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, n), unit="min"))
+             .where(rng.random(n) > 0.1) for col in DATE_COLS}
+    rows = pd.DataFrame({
+        "order_id": np.sort(rng.integers(0, n // 2, n)).astype("int32"),
+        **dates,
+        "order_status": pick(["delivered", "shipped", "canceled"]),
+        "payment_type": pick(PAYMENT_TYPES),
+        "product_category_name": pick(["toys", "auto", "books", None]),
+        "seller_city": pick(["sao paulo", "curitiba", "rio de janeiro"]),
+        "seller_state": pick(["SP", "PR", "RJ"]),
+        "customer_city": pick(["sao paulo", "belo horizonte", "salvador"]),
+        "customer_state": pick(["SP", "MG", "BA"]),
+    })
+    pairs = pd.DataFrame({"order_id": np.repeat(np.arange(n // 2, dtype="int32"), 2),
+                          "payment_type": np.array(PAYMENT_TYPES)[rng.integers(0, 4, n)]})
+    return rows, pairs.drop_duplicates(ignore_index=True)
+
+
+def boolean_mask(rows, pairs, date_col, start_date, end_date, selections):
+    # The chained isin filters the index replaces, with the date bounds on calendar days
+    days = rows[date_col].dt.date
+    mask = ((days >= start_date) & (days <= end_date)).to_numpy()
+    for col, selected in selections.items():
+        if not selected:
+            continue
+        if col == "payment_type":
+            # Any payment of the row's order
+            mask = mask & rows["order_id"].isin(pairs.loc[pairs["payment_type"].isin(selected), "order_id"]).to_numpy()
+        else:
+            mask = mask & rows[col].isin(selected).to_numpy()
+    return mask
+
+
+@pytest.mark.parametrize("date_col, start_date, end_date, selections", [
+    ("order_purchase_timestamp", dt.date(2017, 1, 1), dt.date(2017, 12, 31), {}),
+    ("order_delivered_customer_date", dt.date(2017, 3, 15), dt.date(2017, 3, 15), {}),
+    ("order_purchase_timestamp", dt.date(2017, 2, 1), dt.date(2017, 8, 31),
+     {"order_status": ["delivered"], "customer_state": ["SP", "BA"]}),
+    ("order_estimated_delivery_date", dt.date(2017, 1, 1), dt.date(2017, 6, 30),
+     {"product_category_name": ["toys", "unknown"], "seller_city": ["curitiba"], "seller_state": ["PR", "SP"]}),
+    ("order_purchase_timestamp", dt.date(2017, 1, 1), dt.date(2017, 12, 31), {"payment_type": ["voucher"]}),
+    ("order_delivered_carrier_date", dt.date(2017, 4, 1), dt.date(2017, 10, 1),
+     {"payment_type": ["boleto", "debit_card"], "customer_city": ["salvador", "sao paulo"]}),
+])
+def test_index_mask_matches_the_boolean_filters(date_col, start_date, end_date, selections):
+    rows, pairs = item_rows()
+    index = FilterIndex(rows, multi_values={"payment_type": payment_types(rows["order_id"], pairs)})
+    selections = {col: selections.get(col, []) for col in FILTER_COLS}
+
+    expected = boolean_mask(rows, pairs, date_col, start_date, end_date, selections)
+    assert expected.any()
+    np.testing.assert_array_equal(index.mask(date_col, start_date, end_date, selections), expected)
+
+
+def test_a_payment_type_selects_every_item_of_an_order_paid_with_it():
+    rows = pd.DataFrame({"order_id": np.array([1, 1, 2, 3], dtype="int32"),
+                         "payment_type": ["credit_card", "credit_card", "boleto", "voucher"]})
+    pairs = pd.DataFrame({"order_id": [1, 1, 2, 3], "payment_type": ["credit_card", "voucher", "boleto", "voucher"]})
+    index = FilterIndex(rows, columns=["payment_type"], date_cols=[],
+                        multi_values={"payment_type": payment_types(rows["order_id"], pairs)})
+
+    # Order 1's rows carry its first payment's type only
+    np.testing.assert_array_equal(index.value_mask("payment_type", ["voucher"]), [True, True, False, True])
+    np.testing.assert_array_equal(index.value_mask("payment_type", ["credit_card"]), [True, True, False, False])
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from helper_funcs.data_parser import city_keys, locate_prefixes, nearest_prefixes
+
+# Zip prefix centroids as etl.build_geo_index writes them. Prefixes 29900-29999 are Vitória (ES) and
+# 30100-30199 Belo Horizonte (MG): numerically adjacent, ~240 miles apart.
+GEO_INDEX = pd.DataFrame({
+    "zip_code_prefix": np.array([1001, 1310, 29900, 29990, 30110, 30190, 35500], dtype="int32"),
+    "lat": np.array([-23.55, -23.56, -20.32, -20.29, -19.93, -19.92, -20.14], dtype="float32"),
+    "lng": np.array([-46.63, -46.65, -40.34, -40.30, -43.94, -43.94, -44.88], dtype="float32"),
+    "city": pd.Categorical(["sao paulo", "sao paulo", "vitoria", "vitoria", "belo horizonte",
+                            "belo horizonte", "divinopolis"]),
+    "state": pd.Categorical(["SP", "SP", "ES", "ES", "MG", "MG", "MG"]),
+})
+
+
+def test_indexed_prefixes_locate_themselves():
+    positions = nearest_prefixes([1310, 30190, 1001], ["x", "y", "z"], ["SP", "MG", "SP"], GEO_INDEX)
+    np.testing.assert_array_equal(positions, [1, 5, 0])
+
+
+def test_unmatched_prefix_takes_a_prefix_of_its_city_not_its_numeric_neighbour():
+    # 29999 sorts right next to Vitória's 29990, but the row says Belo Horizonte
+    positions = nearest_prefixes([29999], ["belo horizonte"], ["MG"], GEO_INDEX)
+    assert GEO_INDEX["zip_code_prefix"].iat[positions[0]] in (30110, 30190)
+
+    lat, lng = locate_prefixes([29999], GEO_INDEX, ["belo horizonte"], ["MG"])
+    assert abs(lat[0] - -19.92) < 0.05 and abs(lng[0] - -43.94) < 0.05
+
+
+def test_unmatched_prefix_of_an_unindexed_city_stays_in_its_state():
+    positions = nearest_prefixes([39999], ["montes claros"], ["MG"], GEO_INDEX)
+    assert GEO_INDEX["state"].iat[positions[0]] == "MG"
+
+
+def test_city_names_match_without_accents_or_case():
+    positions = nearest_prefixes([1999], ["São Paulo "], ["SP"], GEO_INDEX)
+    assert GEO_INDEX["city"].iat[positions[0]] == "sao paulo"
+    assert list(city_keys(["São Paulo", "VITÓRIA", None])) == ["sao paulo", "vitoria", ""]
+
+
+def test_each_place_is_searched_once_per_call():
+    # Rows of the same unmatched place get the same centroid, in row order
+    prefixes = [29999, 1310, 29998, 39999]
+    cities = ["belo horizonte", "sao paulo", "belo horizonte", "montes claros"]
+    states = ["MG", "SP", "MG", "MG"]
+    positions = nearest_prefixes(prefixes, cities, states, GEO_INDEX)
+    assert positions[0] == positions[2]
+    assert positions[1] == 1
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from helper_funcs import data_parser, ml_models
+
+GEO_INDEX = pd.DataFrame({
+    "zip_code_prefix": np.array([1001, 1310, 30110], dtype="int32"),
+    "lat": np.array([-23.55, -23.56, -19.93], dtype="float32"),
+    "lng": np.array([-46.63, -46.65, -43.94], dtype="float32"),
+    "city": pd.Categorical(["sao paulo", "sao paulo", "belo horizonte"]),
+    "state": pd.Categorical(["SP", "SP", "MG"]),
+})
+
+
+def order_rows():
+    rows = pd.DataFrame({column: [0, 0] for column in ml_models.MODEL_FEATURES})
+    return rows.drop(columns=["geolocation_zip_code_prefix_x", "geolocation_zip_code_prefix_y"]).assign(
+        order_id=[7, 8],
+        customer_zip_code_prefix=[1310, 30199],
+        customer_city=["sao paulo", "belo horizonte"],
+        customer_state=["SP", "MG"],
+        seller_zip_code_prefix=[1001, 1001],
+        seller_city=["sao paulo", "sao paulo"],
+        seller_state=["SP", "SP"],
+        Churn=[0, 1],
+    )
+
+
+def test_model_frame_has_the_bundled_model_columns(monkeypatch):
+    monkeypatch.setattr(data_parser, "read_geo_index", lambda: GEO_INDEX)
+    df_model = ml_models.model_frame(order_rows())
+
+    assert list(df_model.columns) == ml_models.MODEL_FEATURES + ["Churn"]
+    assert list(ml_models.model_frame(order_rows().drop(columns="Churn")).columns) == ml_models.MODEL_FEATURES
+
+
+def test_geolocation_prefixes_are_the_located_prefixes(monkeypatch):
+    monkeypatch.setattr(data_parser, "read_geo_index", lambda: GEO_INDEX)
+    df_model = ml_models.model_frame(order_rows())
+
+    # 30199 is not indexed: it takes Belo Horizonte's centroid
+    assert list(df_model["geolocation_zip_code_prefix_x"]) == [1310, 30110]
+    assert list(df_model["geolocation_zip_code_prefix_y"]) == [1001, 1001]
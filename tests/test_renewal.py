@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from helper_funcs import customers
+
+
+def baseline_renewal(df):
+    # The Customer Analytics page's original renewal metrics, verbatim
+    delivered_orders = df.loc[df["order_delivered_customer_date"].notnull()]
+    first_orders = (
+        delivered_orders.sort_values("order_purchase_timestamp")
+        .groupby("customer_unique_id")
+        .first()
+        .reset_index()
+    )
+    second_orders = pd.merge(
+        delivered_orders,
+        first_orders[["customer_unique_id", "order_purchase_timestamp"]],
+        on="customer_unique_id",
+        suffixes=["", "_first"],
+    )
+    second_orders = second_orders.loc[
+        (
+            second_orders["order_purchase_timestamp"]
+            < second_orders["order_purchase_timestamp_first"] + pd.Timedelta(days=365)
+        ),
+        :,
+    ]
+    renewed_customers = len(second_orders["customer_unique_id"].unique())
+
+    delivered_orders = df.loc[df["order_delivered_customer_date"].notnull()]
+    first_orders = (
+        delivered_orders.sort_values("order_purchase_timestamp")
+        .groupby("customer_id")
+        .first()
+        .reset_index()
+    )
+    second_orders = pd.merge(
+        delivered_orders,
+        first_orders[["customer_id", "order_purchase_timestamp"]],
+        on="customer_id",
+        suffixes=["", "_first"],
+    )
+    second_orders = second_orders.loc[
+        (
+            second_orders["order_purchase_timestamp"]
+            < second_orders["order_purchase_timestamp_first"] + pd.Timedelta(days=365)
+        ),
+        :,
+    ]
+    renewal_revenue = second_orders["price"].sum()
+    return renewed_customers, renewal_revenue
+
+
+def item_rows(n=5000, seed=0):
+    # Item rows with repeat customers, several customer_ids per customer and undelivered orders
+    rng = np.random.default_rng(seed)
+    customer_unique_id = rng.integers(0, 800, n).astype("int32")
+    purchase = pd.Timestamp("2016-09-01") + pd.to_timedelta(rng.integers(0, 760 * 24, n), unit="h")
+    delivered = purchase + pd.to_timedelta(rng.integers(1, 30, n), unit="D")
+    return pd.DataFrame({
+        "order_id": np.arange(n, dtype="int32") // 2,
+        "customer_unique_id": customer_unique_id,
+        "customer_id": (customer_unique_id * 3 + rng.integers(0, 3, n)).astype("int32"),
+        "order_purchase_timestamp": purchase,
+        "order_delivered_customer_date": delivered.where(rng.random(n) > 0.1),
+        "price": rng.gamma(2, 60, n).round(2),
+    })
+
+
+def test_renewal_matches_the_baseline_definitions():
+    for seed in range(3):
+        df = item_rows(seed=seed)
+        delivered = customers.delivered_rows(df)
+
+        expected_customers, expected_revenue = baseline_renewal(df)
+        assert customers.renewed_customers(delivered) == expected_customers
+        assert customers.renewal_revenue(delivered) == expected_revenue
+
+
+def test_renewal_of_a_filtered_subset_matches_the_baseline():
+    df = item_rows(seed=7)
+    subset = df[df["price"] > 100]
+
+    expected_customers, expected_revenue = baseline_renewal(subset)
+    assert customers.renewed_customers(customers.delivered_rows(subset)) == expected_customers
+    assert customers.renewal_revenue(customers.delivered_rows(subset)) == expected_revenue
+
+
+def test_renewal_window_is_anchored_on_each_keys_first_delivered_purchase():
+    df = pd.DataFrame({
+        "customer_unique_id": [1, 1, 1, 2],
+        "customer_id": [10, 11, 11, 20],
+        "order_purchase_timestamp": pd.to_datetime(["2017-01-01", "2017-06-01", "2018-03-01", "2018-01-01"]),
+        "order_delivered_customer_date": pd.to_datetime(["2017-01-05", "2017-06-05", "2018-03-05", None]),
+        "price": [10.0, 20.0, 40.0, 80.0],
+    })
+    delivered = customers.delivered_rows(df)
+
+    # Customer 2 has no delivered order; customer_id 11's window starts at its own first purchase
+    assert customers.renewed_customers(delivered) == 1
+    assert customers.renewal_revenue(delivered) == 70.0
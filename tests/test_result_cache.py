@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from helper_funcs.result_cache import ResultCache, frame_bytes
+
+
+def test_least_recently_used_entries_are_evicted_past_max_entries():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_entries_are_evicted_past_the_memory_budget():
+    frame = pd.DataFrame({"x": np.zeros(1000)})
+    cache = ResultCache(max_entries=10, max_bytes=int(frame_bytes(frame) * 2.5))
+    for key in "abc":
+        cache.put(key, frame.copy())
+
+    assert cache.get("a") is None
+    assert len(cache) == 2
+    assert cache.nbytes == 2 * frame_bytes(frame)
+
+
+def test_the_newest_entry_is_kept_even_over_budget():
+    cache = ResultCache(max_bytes=10)
+    cache.put("small", pd.Series([1.0]))
+    big = pd.DataFrame({"x": np.zeros(1000)})
+
+    assert cache.put("big", big) is big
+    assert cache.get("big") is big
+    assert cache.get("small") is None
+
+
+def test_putting_a_key_again_replaces_its_size():
+    cache = ResultCache()
+    cache.put("a", pd.DataFrame({"x": np.zeros(100)}))
+    cache.put("a", pd.DataFrame({"x": np.zeros(10)}))
+
+    assert len(cache) == 1
+    assert cache.nbytes == frame_bytes(pd.DataFrame({"x": np.zeros(10)}))
+    cache.clear()
+    assert (len(cache), cache.nbytes) == (0, 0)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from sklearn.tree import DecisionTreeClassifier
+
+from helper_funcs.scorer import Scorer
+
+# Encoded training frame: payment_type one-hot encoded, state target encoded, price imputed
+ENCODED = pd.DataFrame({
+    "payment_type_credit_card": [1.0, 0.0, 0.0, 1.0],
+    "payment_type_boleto": [0.0, 1.0, 0.0, 0.0],
+    "price": [10.0, 20.0, 30.0, 40.0],
+    "state": [0.2, 0.8, 0.5, 0.2],
+    "zip": [1, 2, 3, 4],
+})
+
+
+def scorer():
+    estimator = DecisionTreeClassifier(random_state=0).fit(ENCODED, [0, 1, 1, 0])
+    return Scorer(
+        estimator,
+        fill_values={"price": 25.0},
+        categories={"payment_type": ["credit_card", "boleto"], "state": ["SP", "MG"]},
+        tables={
+            # rows: known categories, then unseen, then missing
+            "payment_type": (["payment_type_credit_card", "payment_type_boleto"],
+                             np.array([[1.0, 0.0], [0.0, 1.0], [0.0, 0.0], [1.0, 0.0]])),
+            "state": (["state"], np.array([[0.2], [0.8], [0.5], [0.2]])),
+        },
+    )
+
+
+def test_transform_looks_up_categories_and_imputes_numbers():
+    X = pd.DataFrame({
+        "zip": [7, 8, 9, 10],
+        "state": pd.Categorical(["MG", "RJ", None, "SP"]),
+        "payment_type": ["boleto", "voucher", None, "credit_card"],
+        "price": [1.0, np.nan, 3.0, 4.0],
+    }, index=[5, 6, 7, 8])
+
+    encoded = scorer().transform(X)
+
+    assert list(encoded.columns) == list(ENCODED.columns)
+    assert list(encoded.index) == [5, 6, 7, 8]
+    np.testing.assert_array_equal(encoded["payment_type_credit_card"], [0, 0, 1, 1])
+    np.testing.assert_array_equal(encoded["payment_type_boleto"], [1, 0, 0, 0])
+    np.testing.assert_array_equal(encoded["state"], [0.8, 0.5, 0.2, 0.2])
+    np.testing.assert_array_equal(encoded["price"], [1.0, 25.0, 3.0, 4.0])
+    np.testing.assert_array_equal(encoded["zip"], [7, 8, 9, 10])
+
+
+def test_predictions_are_the_estimators_on_the_encoded_rows():
+    X = pd.DataFrame({"zip": [1, 2], "state": ["SP", "MG"], "payment_type": ["credit_card", "boleto"],
+                      "price": [10.0, 20.0]})
+    model = scorer()
+
+    np.testing.assert_array_equal(model.predict_proba(X), model.estimator.predict_proba(ENCODED.iloc[:2]))
+    np.testing.assert_array_equal(model.predict(X), [0, 1])